@@ -0,0 +1,157 @@
+// filter: rebuilds every graph in the browser from the per-day rollups in the Rollup-Store,
+// so moving the DatePicker never reaches the server.
+// zones: the heart rate zone graph filter draws from the per-day zone minutes.
+// visible: reports which graphs are on screen so the server only renders those.
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    graphs: {
+        visible: function(n_intervals) {
+            var Ids = Array.prototype.slice.call(arguments, 1);
+            var Shown = window.dash_clientside.graphs.shown;
+            var Changed = false;
+            var Result = Ids.map(function(id) {
+                var Graph = document.getElementById(id.replace(/-Visible$/, ""));
+                var Box = Graph ? Graph.getBoundingClientRect() : null;
+                var Visible = !!Box && Box.bottom > -200 && Box.top < window.innerHeight + 200;
+                if (Shown[id] === Visible) {
+                    return window.dash_clientside.no_update;
+                }
+                Shown[id] = Visible;
+                Changed = true;
+                return Visible;
+            });
+            if (!Changed) {
+                throw window.dash_clientside.PreventUpdate;
+            }
+            return Result;
+        },
+        shown: {},
+        zones: function(Spec, Rollup, store, First, Last, Range, toISO) {
+            // Stacked minutes per zone, summed per month and weekday like the server's HeartRateZoneGraph
+            var Names = Object.keys(Rollup.zones);
+            var Groups = {startDate: {}, month: {}, DayofWeek: {}};
+            var Labels = {startDate: "Day", month: "Month", DayofWeek: "Weekday"};
+            store.order.forEach(function(name) {
+                Groups.DayofWeek[name] = Names.map(function() { return 0; });
+            });
+            for (var i = 0; i < Rollup.day.length; i++) {
+                var day = Rollup.day[i];
+                if (day <= First || day > Last) { continue; }
+                var Keys = [["startDate", toISO(day)], ["month", toISO(day).slice(0, 7)], ["DayofWeek", store.order[(day + 3) % 7]]];
+                Keys.forEach(function(key) {
+                    var Group = Groups[key[0]];
+                    Group[key[1]] = Group[key[1]] || Names.map(function() { return 0; });
+                    Names.forEach(function(name, z) { Group[key[1]][z] += Rollup.zones[name][i]; });
+                });
+            }
+            var Title = function(by) {
+                return Spec.title + " Per " + by + Range + " (max " + Rollup.max_hr.toFixed(0) + " CPM)";
+            };
+            var Data = [], Shown = {};
+            Object.keys(Groups).forEach(function(by) {
+                var X = by === "DayofWeek" ? store.order : Object.keys(Groups[by]).sort();
+                Shown[by] = [];
+                Names.forEach(function(name, z) {
+                    Shown[by].push(Data.length);
+                    Data.push({type: "bar", x: X, y: X.map(function(x) { return Groups[by][x][z]; }), name: name,
+                        marker: {color: store.colors.zones[z]}, legendgroup: name, showlegend: by === "startDate", visible: by === "startDate"});
+                });
+            });
+            var Layout = JSON.parse(JSON.stringify(store.layout));
+            Layout.title = Title("Day");
+            Layout.yaxis.title.text = Spec.unit;
+            Layout.barmode = "stack";
+            Layout.updatemenus = [{
+                active: 0, direction: "down", pad: {r: 4, t: 0}, x: 0.93, y: 1.2, showactive: true,
+                buttons: Object.keys(Shown).map(function(by) {
+                    return {label: "Zones Per " + Labels[by], method: "update", args: [
+                        {visible: Data.map(function(trace, i) { return Shown[by].indexOf(i) >= 0; }), x: Data.map(function(trace) { return trace.x; })},
+                        {title: Title(Labels[by]), "yaxis.title.text": Spec.unit}]};
+                })
+            }];
+            return {layout: Layout, data: Data};
+        },
+        filter: function(start_date, end_date, store) {
+            if (!store || !start_date || !end_date) {
+                throw window.dash_clientside.PreventUpdate;
+            }
+            var Months = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"];
+            var toDay = function(date) { return Math.floor(Date.parse(date) / 86400000); };
+            var toISO = function(day) { return new Date(day * 86400000).toISOString().slice(0, 10); };
+            var pretty = function(date) {
+                var d = new Date(Date.parse(date));
+                return Months[d.getUTCMonth()] + " " + String(d.getUTCDate()).padStart(2, "0") + ", " + d.getUTCFullYear();
+            };
+            var First = toDay(start_date), Last = toDay(end_date);
+            var Start = pretty(start_date), End = pretty(end_date);
+            var Range = " from " + Start + " to " + End;
+
+            return store.graphs.map(function(id) {
+                var Spec = store.specs[id];
+                var Rollup = store.rollups[Spec.rollup || Spec.type];
+                var Color = store.colors[Spec.fn === "sum" || Spec.fn === "mean" ? "attribute" : "high"];
+                if (!Rollup) {
+                    var Message = JSON.parse(JSON.stringify(store.empty));
+                    Message.layout.annotations[0].text = "Watch does not record " + Spec.title;
+                    return Message;
+                }
+
+                if (Spec.fn === "zones") {
+                    return window.dash_clientside.graphs.zones(Spec, Rollup, store, First, Last, Range, toISO);
+                }
+
+                // Same window as the server callbacks: after the start date, up to and including the end date
+                var Days = [], Month = {}, Weekday = {};
+                store.order.forEach(function(name) { Weekday[name] = {sum: 0, count: 0}; });
+                for (var i = 0; i < Rollup.day.length; i++) {
+                    var day = Rollup.day[i];
+                    if (day <= First || day > Last) { continue; }
+                    var Sum = Rollup.sum[i], Count = Rollup.count[i];
+                    Days.push({x: toISO(day), sum: Sum, count: Count, min: Rollup.min[i], max: Rollup.max[i]});
+                    var Key = toISO(day).slice(0, 7);
+                    Month[Key] = Month[Key] || {sum: 0, count: 0};
+                    Month[Key].sum += Sum; Month[Key].count += Count;
+                    var Name = store.order[(day + 3) % 7];
+                    Weekday[Name].sum += Sum; Weekday[Name].count += Count;
+                }
+                var value = function(g) { return Spec.fn === "sum" ? g.sum : (g.count ? g.sum / g.count : null); };
+                var Layout = JSON.parse(JSON.stringify(store.layout));
+                Layout.yaxis.title.text = Spec.unit;
+                var X = Days.map(function(d) { return d.x; });
+
+                if (Spec.fn === "range") {
+                    Layout.title = Spec.title + Range;
+                    Layout.showlegend = false;
+                    return {layout: Layout, data: [
+                        {type: "scatter", x: X, y: Days.map(function(d) { return d.max; }), name: Spec.name, fill: "tonexty", mode: "lines+markers", marker: {color: store.colors.high}},
+                        {type: "scatter", x: X, y: Days.map(function(d) { return d.min; }), name: Spec.name, fill: "tozeroy", mode: "lines+markers", marker: {color: store.colors.low}}]};
+                }
+                if (Spec.fn === "daily") {
+                    Layout.title = Spec.title + Range;
+                    return {layout: Layout, data: [
+                        {type: "scatter", x: X, y: Days.map(value), name: Spec.name, fill: "tonexty", mode: "lines+markers", marker: {color: Color}}]};
+                }
+
+                var Label = Spec.fn === "sum" ? "Total" : "Average";
+                var Month_Range = Object.keys(Month).sort();
+                Layout.title = Label + " " + Spec.title + " Per Day" + Range;
+                Layout.updatemenus = [{
+                    active: 0, direction: "down", pad: {r: 4, t: 0}, x: 0.93, y: 1.2, showactive: true,
+                    buttons: [
+                        {label: Label + " Per Day", method: "update", args: [
+                            {visible: [true, false, false], x: [X]},
+                            {title: Label + " " + Spec.title + " Per Day" + Range, "yaxis.title.text": Spec.unit}]},
+                        {label: Label + " Per Month", method: "update", args: [
+                            {visible: [false, true, false], x: [Month_Range]},
+                            {title: Label + " " + Spec.title + " Per Month" + Range, "yaxis.title.text": Spec.unit}]},
+                        {label: Label + " Per Weekday", method: "update", args: [
+                            {visible: [false, false, true], x: [store.order]},
+                            {title: Label + " " + Spec.title + " Per Weekday" + Range, "yaxis.title.text": Spec.unit, "xaxis.dtick": "M1", "xaxis.showgrid": true}]}]
+                }];
+                return {layout: Layout, data: [
+                    {type: "scatter", x: X, y: Days.map(value), name: Spec.name, fill: "tonexty", mode: "lines+markers", marker: {color: Color}, visible: true},
+                    {type: "bar", x: Month_Range, y: Month_Range.map(function(m) { return value(Month[m]); }), name: Spec.name, marker: {color: Color}, visible: false},
+                    {type: "bar", x: store.order, y: store.order.map(function(w) { return Weekday[w].count ? value(Weekday[w]) : null; }), name: Spec.name, marker: {color: Color}, visible: false}]};
+            });
+        }
+    }
+});
@@ -6,6 +6,10 @@ Credits: Some of the below code was sourceed from the following -
         https://github.com/mganjoo/apple-health-exporter (ZIP to XML)
 
 """
+#Boot timing:
+import time
+Boot_Start = time.perf_counter()
+
 #Dash components:
 import dash
 import dash_core_components as dcc
@@ -16,22 +20,21 @@ from dash.exceptions import PreventUpdate
 
 #Data and Graphing
 import pandas as pd
-import plotly.express as px
 import plotly.graph_objects as go
-import dash_resumable_upload
 
 #Files
-from zipfile import ZipFile
-import zipfile
 import io
 import base64
 import os
-from src.options import Get_Drop_Choices, Explination_Table
-from src.upload import health_xml_to_feather
+from src.options import Get_Drop_Choices, Explination_Table, Graph_Specs, Order
+from src import dataset, query, pyramid, sketches, manifest, prefix, zones, intervals
+from flask import request, Response, stream_with_context
 from flask_caching import Cache
 
 #STL
-import time
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import warnings
 import copy
 
@@ -43,15 +46,21 @@ import json
 #Variables:
 warnings.filterwarnings("ignore")
 TIMEOUT = 60
-app = dash.Dash(__name__)
-cache = Cache(app.server, config={
-    "CACHE_TYPE": "filesystem",
-    "CACHE_DIR": "cache-directory"
-})
-Order = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+WARM_RANGES = [None, 30, 90, 365] #Date ranges precomputed after an upload, None is everything ingested
+CLIENTSIDE_FILTERING = os.environ.get("CLIENTSIDE_FILTERING", "0") == "1" #Filter date ranges in the browser from daily rollups
+LAZY_RENDERING = os.environ.get("LAZY_RENDERING", "0") == "1" #Only compute graphs that are scrolled into view
+DATA_BACKEND = os.environ.get("DATA_BACKEND", "memory") #"memory" (shared Arrow table) or "dataset" (out-of-core Parquet)
+STORAGE_FORMAT = os.environ.get("STORAGE_FORMAT", "feather") #"feather" or "parquet" for the ingested records file
+METRIC_GROUPS = ["day", "month", "weekday"] #/api/metrics agg values, in the order Group_Dates returns them
+METRIC_TOTAL = "total" #/api/metrics agg over the whole range, two lookups in the prefix sums of the summed metrics
+METRIC_FUNCTIONS = ["sum", "mean", "min", "max"]
+Import_Time = time.perf_counter() - Boot_Start
+cache = Cache()
+Callbacks = []
 Attribute_Color = "#2BFEBE"
 Heart_High_Color = "#E93329"
 Heart_Low_Color = "#2ab0fe"
+Zone_Colors = ["#2ab0fe", "#2BFEBE", "#B8E986", "#F8E71C", "#F5A623", "#E93329"]
 No_Data_Header_Message = "No Apple Health Data Uploaded"
 config = {"displayModeBar": False}
 df = "None"
@@ -81,7 +90,7 @@ No_Data_Graph_Message = {
     }
 
 
-app.layout = html.Div(
+Layout = html.Div(
     [
         html.Div(
             [
@@ -97,7 +106,10 @@ app.layout = html.Div(
             [
                 html.Div(
                     [
-                    html.P(No_Data_Header_Message, className = "control_label", id = "Data-Information")
+                    html.P(No_Data_Header_Message, className = "control_label", id = "Data-Information"),
+                    dcc.Store(id = "Rollup-Store"),
+                    dcc.Interval(id = "Visibility-Interval", interval = 500, disabled = not LAZY_RENDERING),
+                    html.Div([dcc.Store(id = f"{Graph}-Visible") for Graph in Graph_Specs])
                     ],  
                     className = "pretty_container four columns", id = "Explination-Box"),
                 html.Div(
@@ -209,7 +221,7 @@ app.layout = html.Div(
                 ),
                 html.Div(
                     [
-                        dcc.Graph(id = "WalkingHeartRateAverageGraph", figure = No_Data_Graph_Message, config = config)
+                        dcc.Graph(id = "HeartRateZoneGraph", figure = No_Data_Graph_Message, config = config)
                     ],
                     className = "pretty_container six columns",
                 ),
@@ -219,12 +231,24 @@ app.layout = html.Div(
 
         html.Div(
             [
+                html.Div(
+                    [
+                        dcc.Graph(id = "WalkingHeartRateAverageGraph", figure = No_Data_Graph_Message, config = config)
+                    ],
+                    className = "pretty_container six columns",
+                ),
                 html.Div(
                     [
                         dcc.Graph(id = "RestingHeartRateAverageGraph", figure = No_Data_Graph_Message, config = config)
                     ],
                     className = "pretty_container six columns",
                 ),
+            ],
+            className = "row"
+        ),
+
+        html.Div(
+            [
                 html.Div(
                     [
                         dcc.Graph(id = "HeartRateVariabilityGraph", figure = No_Data_Graph_Message, config = config)
@@ -239,17 +263,332 @@ app.layout = html.Div(
     style={"display": "flex", "flex-direction": "column"}) # End of HTML Components
 
 
+def callback(*args, **kwargs):
+    # Callbacks are collected here and wired up to the app in create_app()
+    def register(func):
+        Callbacks.append((args, kwargs, func))
+        return func
+    return register
+
+def create_app():
+    """
+    Builds the Dash app. Heavy ingestion imports (lxml, zipfile) are deferred until an upload happens.
+    Run under gunicorn with: gunicorn --preload "main:create_server()"
+    """
+    Build_Start = time.perf_counter()
+    app = dash.Dash(__name__)
+    cache.init_app(app.server, config={
+        "CACHE_TYPE": "filesystem",
+        "CACHE_DIR": "cache-directory"
+    })
+    app.layout = Serve_Layout
+    for args, kwargs, func in Callbacks:
+        Graph = args[0].component_id
+        if Graph in Graph_Specs:
+            if CLIENTSIDE_FILTERING:
+                continue #Drawn by assets/graphs.js instead
+            Graph_Figures[Graph] = func
+            Graph_Inputs[Graph] = len(args[1])
+            if LAZY_RENDERING:
+                app.callback(args[0], args[1] + [Input(f"{Graph}-Visible", "data")], **kwargs)(lazy(Graph))
+            else:
+                app.callback(*args, **kwargs)(memoized(Graph))
+            continue
+        if args[0].component_property == "figure":
+            #Graphs drawn only on the server (no rollup spec) are still cached and warmed
+            Graph_Figures[Graph] = func
+            Graph_Inputs[Graph] = len(args[1])
+            app.callback(*args, **kwargs)(memoized(Graph))
+            continue
+        app.callback(*args, **kwargs)(func)
+
+    if LAZY_RENDERING and not CLIENTSIDE_FILTERING:
+        app.clientside_callback(
+            ClientsideFunction(namespace = "graphs", function_name = "visible"),
+            [Output(f"{Graph}-Visible", "data") for Graph in Graph_Specs],
+            [Input("Visibility-Interval", "n_intervals")],
+            [State(f"{Graph}-Visible", "id") for Graph in Graph_Specs])
+
+    if CLIENTSIDE_FILTERING:
+        app.clientside_callback(
+            ClientsideFunction(namespace = "graphs", function_name = "filter"),
+            [Output(Graph, "figure") for Graph in Graph_Specs],
+            [Input("DatePicker", "start_date"),
+            Input("DatePicker", "end_date")],
+            [State("Rollup-Store", "data")])
+
+    @app.server.route("/export")
+    def export_records():
+        """
+        Streams records as Arrow IPC, Parquet or CSV, one record batch at a time:
+            /export?types=HKQuantityTypeIdentifierHeartRate,HKQuantityTypeIdentifierStepCount&start=2021-01-01&end=2021-12-31&format=parquet
+        Local days after start up to and including end, like the DatePicker. Every type and date ingested by default.
+        """
+        from src import export
+        fmt = request.args.get("format", "arrow")
+        if fmt not in export.EXPORT_FORMATS:
+            return Response(f"Unknown format {fmt}, expected one of {', '.join(export.EXPORT_FORMATS)}\n", status = 400, mimetype = "text/plain")
+        Bounds = manifest.date_bounds()
+        if Bounds is None:
+            return Response(f"{No_Data_Header_Message}\n", status = 404, mimetype = "text/plain")
+        try:
+            start_date = pd.Timestamp(request.args.get("start") or Bounds[0] - pd.Timedelta(days = 1))
+            end_date = pd.Timestamp(request.args.get("end") or Bounds[1])
+        except ValueError:
+            return Response("start and end must be dates like 2021-01-31\n", status = 400, mimetype = "text/plain")
+        types = [Type for Type in request.args.get("types", "").split(",") if Type] or [Option["value"] for Option in Drop_Choices()]
+        first_day, last_day = prefix.day_number(start_date) + 1, prefix.day_number(end_date)
+
+        if DATA_BACKEND == "dataset":
+            Schema, batches = export.dataset_batches(types, first_day, last_day)
+        else:
+            Schema, batches = export.table_batches(dataset.table(), types, first_day, last_day)
+        mimetype, extension = export.EXPORT_FORMATS[fmt]
+        Filename = f"apple-health-{start_date:%Y-%m-%d}-{end_date:%Y-%m-%d}{extension}"
+        return Response(stream_with_context(export.stream(Schema, batches, fmt)), mimetype = mimetype,
+            headers = {"Content-Disposition" : f"attachment; filename={Filename}"})
+
+    @app.server.route("/api/metrics/<Type>")
+    def metric_aggregates(Type):
+        """
+        One type aggregated per day, month or weekday, from the same cached aggregates as the graphs:
+            /api/metrics/HKQuantityTypeIdentifierStepCount?start=2021-01-01&end=2021-12-31&agg=month&fn=sum&format=arrow
+        Columnar JSON ({"key" : [...], "value" : [...]}) or an Arrow IPC stream. The ETag is the dataset version,
+        so polling with If-None-Match gets a 304 until the next upload. Without start/end it covers the DatePicker's default range.
+        agg=total gives one value over the whole range, the total (fn=sum) or average per day (fn=mean) of a summed metric.
+        """
+        agg, fn, fmt = request.args.get("agg", "day"), request.args.get("fn", "sum"), request.args.get("format", "json")
+        for Name, value, Allowed in [("agg", agg, METRIC_GROUPS + [METRIC_TOTAL]), ("fn", fn, METRIC_FUNCTIONS), ("format", fmt, ["json", "arrow"])]:
+            if value not in Allowed:
+                return Response(f"Unknown {Name} {value}, expected one of {', '.join(Allowed)}\n", status = 400, mimetype = "text/plain")
+        Manifest = manifest.Read_JSON()
+        if Manifest is None or Manifest["First Date Instance"] is None:
+            return Response(f"{No_Data_Header_Message}\n", status = 404, mimetype = "text/plain")
+        if Type not in Manifest["Types"]:
+            return Response(f"No {Type} records ingested\n", status = 404, mimetype = "text/plain")
+
+        try:
+            start_date = pd.Timestamp(request.args.get("start") or Manifest["First Date Instance"])
+            end_date = pd.Timestamp(request.args.get("end") or Manifest["Last Date Instance"])
+        except ValueError:
+            return Response("start and end must be dates like 2021-01-31\n", status = 400, mimetype = "text/plain")
+        if agg == METRIC_TOTAL and (fn not in ["sum", "mean"] or Type not in prefix.PREFIX_TYPES):
+            return Response(f"agg={METRIC_TOTAL} takes fn=sum or fn=mean for one of {', '.join(prefix.PREFIX_TYPES)}\n", status = 400, mimetype = "text/plain")
+
+        # Only a valid request can be answered with a 304
+        ETag = f"{Manifest['Dataset Version']}-{fmt}"
+        if request.if_none_match.contains(ETag):
+            return Response(status = 304, headers = {"ETag" : f'"{ETag}"'})
+
+        if agg == METRIC_TOTAL:
+            Totals = prefix.range_total(Type, start_date, end_date)
+            if Totals is None:
+                return Response(f"No daily totals for {Type}, re-upload the export to build them\n", status = 404, mimetype = "text/plain")
+            Keys, Values = [f"{start_date:%Y-%m-%d}/{end_date:%Y-%m-%d}"], [Totals[0] if fn == "sum" else Totals[1]]
+        elif agg == "weekday":
+            Grouped = Group_Dates(Type, start_date, end_date, fn)[METRIC_GROUPS.index(agg)]
+            Keys, Values = Grouped.index.tolist(), Grouped.values
+        else:
+            Grouped = Group_Dates(Type, start_date, end_date, fn)[METRIC_GROUPS.index(agg)]
+            Keys, Values = Grouped.iloc[:, 0].astype(str).tolist(), Grouped["value"].values
+        if fmt == "arrow":
+            import pyarrow as pa
+            Table = pa.table({"key" : pa.array(Keys, pa.string()), "value" : pa.array(Values, pa.float64(), from_pandas = True)})
+            Sink = pa.BufferOutputStream()
+            with pa.ipc.new_stream(Sink, Table.schema) as Writer:
+                Writer.write_table(Table)
+            Body, mimetype = Sink.getvalue().to_pybytes(), "application/vnd.apache.arrow.stream"
+        else:
+            Body = json.dumps({"type" : Type, "start" : f"{start_date:%Y-%m-%d}", "end" : f"{end_date:%Y-%m-%d}", "agg" : agg, "fn" : fn,
+                "key" : Keys, "value" : [None if pd.isna(value) else round(float(value), 3) for value in Values]}, separators = (",", ":"))
+            mimetype = "application/json"
+        return Response(Body, mimetype = mimetype, headers = {"ETag" : f'"{ETag}"', "Cache-Control" : "no-cache"})
+
+    Layout_Served = []
+    @app.server.after_request
+    def report_first_layout(response):
+        if not Layout_Served and request.path.endswith("_dash-layout"):
+            Layout_Served.append(True)
+            print(f"First layout served {time.perf_counter() - Boot_Start:.3f}s after boot")
+        return response
+
+    print(f"Imports took {Import_Time:.3f}s, app built in {time.perf_counter() - Build_Start:.3f}s")
+    return app
+
+def create_server():
+    return create_app().server
+
+
+Graph_Figures = {}
+Graph_Inputs = {}
+Warmer = ThreadPoolExecutor(max_workers = 1, thread_name_prefix = "warm_cache")
+Warming = {"future" : None, "stop" : threading.Event()}
+
+def data_version():
+    # Changes with every ingestion, so cached figures never outlive the data they were drawn from
+    return manifest.version()
+
+def Drop_Choices():
+    # Only the metrics the last upload actually has, in the usual order
+    Manifest = manifest.Read_JSON()
+    if Manifest is None:
+        return Get_Drop_Choices()
+    return [Choice for Choice in Get_Drop_Choices() if Choice["value"] in Manifest["Types"]]
 
+@cache.memoize(timeout=TIMEOUT)
+def cached_figure(Graph, version, *inputs):
+    # Stored as a plain dict, unpickling a go.Figure re-runs plotly's validation
+    return Graph_Figures[Graph](*inputs).to_dict()
+
+def memo_inputs(inputs):
+    # relayoutData (the only dict input) reduced to its x range before it becomes part of the cache key
+    return [Zoom_Range(value) if isinstance(value, dict) else value for value in inputs]
+
+def memoized(Graph):
+    @functools.wraps(Graph_Figures[Graph])
+    def render(*inputs):
+        return cached_figure(Graph, data_version(), *memo_inputs(inputs))
+    return render
+
+def warm_cache(First_Date, Last_Date, stop = None):
+    """
+    Draws every graph for the full range and the last 30/90/365 days into the cache, full range first
+    since the DatePicker asks for it right after an upload. Inputs other than the dates start out as None.
+    Returns early, after the graph being drawn, once stop is set.
+    """
+    version = data_version()
+    Start = time.perf_counter()
+    Ranges = []
+    for Days in WARM_RANGES:
+        First = First_Date if Days is None else max(First_Date, Last_Date - pd.Timedelta(days = Days).to_pytimedelta())
+        if (First, Last_Date) not in Ranges:
+            Ranges.append((First, Last_Date))
+    for First, Last in Ranges:
+        for Graph in Graph_Figures:
+            if stop is not None and stop.is_set():
+                print(f"Stopped warming after {time.perf_counter() - Start:.3f}s")
+                return
+            try:
+                cached_figure(Graph, version, First.isoformat(), Last.isoformat(), *[None] * (Graph_Inputs[Graph] - 2))
+            except Exception as e:
+                print(f"{e} warming {Graph}")
+    print(f"Warmed {len(Graph_Figures)} graphs over {len(Ranges)} ranges in {time.perf_counter() - Start:.3f}s")
+
+def start_warming(First_Date, Last_Date):
+    # One warm at a time: the last upload's warm is stopped or dropped before this one is queued
+    stop_warming()
+    Warming["stop"] = threading.Event()
+    Warming["future"] = Warmer.submit(warm_cache, First_Date, Last_Date, Warming["stop"])
+
+def stop_warming():
+    Warming["stop"].set()
+    if Warming["future"] is not None:
+        Warming["future"].cancel()
+
+def shutdown_warming():
+    stop_warming()
+    Warmer.shutdown(wait = True, cancel_futures = True)
+
+#Runs before exit joins the warm thread (plain atexit would wait out the whole warm first)
+threading._register_atexit(shutdown_warming)
+
+def lazy(Graph):
+    # Off-screen graphs keep their old (stale) figure until they are scrolled into view
+    @functools.wraps(Graph_Figures[Graph])
+    def render(*inputs):
+        *inputs, visible = inputs
+        if not visible or inputs[0] is None or inputs[1] is None:
+            raise PreventUpdate
+        return cached_figure(Graph, data_version(), *memo_inputs(inputs))
+    return render
+
+def dataframe(Type):
+    # Rows for one type, read from the dataset shared by all workers
+    return dataset.records(Type)
+
+def has_data(Type):
+    if DATA_BACKEND == "dataset":
+        return query.has_type(Type)
+    return dataset.has_type(Type)
+
+def Percentile_Bands(Type, start_date, end_date, Name, Color):
+    """
+    5th-95th percentile band and median per day, month and weekday, merged from the daily quantile sketches.
+    Returns {grouping : [traces]}, empty when there are no sketches for the type.
+    """
+    Groups = sketches.percentiles(Type, start_date, end_date)
+    Bands = {}
+    for By, Group in (Groups or {}).items():
+        X = Group.index.tolist()
+        Bands[By] = [
+            go.Scatter(x = X, y = Group.p95, name = f"95th {Name}", mode = "lines", line_width = 0, marker_color = Color, visible = False),
+            go.Scatter(x = X, y = Group.p5, name = f"5th {Name}", mode = "lines", line_width = 0, fill = "tonexty", marker_color = Color, visible = False),
+            go.Scatter(x = X, y = Group.p50, name = f"Median {Name}", mode = "lines+markers", marker_color = Color, visible = False)]
+    return Bands
+
+def Percentile_Buttons(Graphs, Bands, Title, start_date, end_date, Unit):
+    # Every trace gets its own x back, the other buttons overwrite x on all traces
+    Names = {"startDate" : "Day", "month" : "Month", "DayofWeek" : "Weekday"}
+    return [
+        {"label" : f"Percentiles Per {Names[By]}", "method" : "update", "args" : [
+            {"visible" : [Trace in Traces for Trace in Graphs], "x" : [Trace.x for Trace in Graphs]},
+            {"title" : f"5th, 50th and 95th Percentile {Title} Per {Names[By]} from {start_date} to {end_date}", "yaxis.title.text" : Unit}]
+        } for By, Traces in Bands.items()]
+
+def Zoom_Range(relayoutData):
+    # Only an x range changes what is drawn: autosize, autorange and y zooms become None, the unzoomed (and warmed) cache entry
+    Data = relayoutData or {}
+    Range = Data.get("xaxis.range") or [Data.get("xaxis.range[0]"), Data.get("xaxis.range[1]")]
+    return None if None in Range else {"xaxis.range" : list(Range)}
+
+def Zoom_Window(start_date, end_date, relayoutData):
+    """
+    Time window a graph is showing: the picked dates (after start_date, up to and including end_date),
+    narrowed to the x range the user zoomed into when that overlaps them.
+    """
+    First = pd.Timestamp(start_date) + pd.Timedelta(days = 1)
+    Last = pd.Timestamp(end_date) + pd.Timedelta(days = 1)
+    Zoom = Zoom_Range(relayoutData)
+    if Zoom is not None:
+        Range = Zoom["xaxis.range"]
+        Zoom_First, Zoom_Last = max(First, pd.Timestamp(Range[0])), min(Last, pd.Timestamp(Range[1]))
+        if Zoom_First < Zoom_Last:
+            return Zoom_First, Zoom_Last
+    return First, Last
+
+def Group_Dates(Type, start_date, end_date, fn):
+    # Shared by the graphs and /api/metrics through the cache, keyed on the dataset version and ISO dates
+    # so "Jan 05, 2020" from a graph and "2020-01-05" from the API hit the same entry
+    start_date, end_date = pd.Timestamp(start_date).strftime("%Y-%m-%d"), pd.Timestamp(end_date).strftime("%Y-%m-%d")
+    return cached_aggregates(Type, data_version(), start_date, end_date, fn)
 
 @cache.memoize(timeout=TIMEOUT)
-def query_data():
-    df = "Data/data.feather"
-    return df
+def cached_aggregates(Type, version, start_date, end_date, fn):
+    return Aggregate_Dates(Type, start_date, end_date, fn)
+
+def Aggregate_Dates(Type, start_date, end_date, fn):
+    """
+    Aggregates one type per day, month and weekday between the picked dates.
+    Returns (By_Day, By_Month, By_DayofWeek), from memory or streamed off the Parquet dataset.
+    """
+    if DATA_BACKEND == "dataset":
+        return query.aggregate(Type, start_date, end_date, fn)
+
+    df = dataframe(Type)
+    if fn == "sum":
+        #Totals split records spanning midnight across both days, like the trends from the prefix sums
+        return intervals.calendar_totals(intervals.apportion(df), prefix.day_number(start_date) + 1, prefix.day_number(end_date))
+    df["startDate"] = df["startDate"].dt.date
+
+    Date_Range = (df["startDate"] > pd.to_datetime(start_date)) & (df["startDate"] <= pd.to_datetime(end_date))
+    Specified_Dates = df.loc[Date_Range]
 
-def dataframe():
-    return pd.read_feather(query_data())
+    By_Day = Specified_Dates.groupby(["startDate"])["value"].agg(fn).reset_index(name = "value")
+    By_Month = Specified_Dates.groupby(["month"])["value"].agg(fn).reset_index(name = "value")
+    By_DayofWeek = Specified_Dates.groupby(["DayofWeek"])["value"].agg(fn).reindex(Order)
+    return By_Day, By_Month, By_DayofWeek
 
-@app.callback(Output("Explination-Box", "children"),
+@callback(Output("Explination-Box", "children"),
                 [Input("Data-Dropdown", "value")])
 def Expliantions(value):
     if value is not None:
@@ -257,11 +596,49 @@ def Expliantions(value):
     else:
         pass
 
-@app.callback(Output("DatePicker", "disabled"),
+def Rollup_Store(Rollups):
+    # Everything assets/graphs.js needs to draw the graphs in the browser
+    return {"rollups" : Rollups, "graphs" : list(Graph_Specs), "specs" : Graph_Specs, "layout" : layout, "order" : Order,
+        "colors" : {"attribute" : Attribute_Color, "high" : Heart_High_Color, "low" : Heart_Low_Color, "zones" : Zone_Colors}, "empty" : No_Data_Graph_Message}
+
+@functools.lru_cache(maxsize = 1)
+def Restored_Rollups(version):
+    # Rollups the ingestion of this dataset version wrote, rebuilt from its records if it predates them
+    from src.rollups import read_rollups, daily_rollups
+    from src.storage import read_records
+    Rollups = read_rollups(version)
+    if Rollups is None:
+        Rollups = daily_rollups(read_records(manifest.Read_JSON()["Records File"], columns = ["type", "startDate", "endDate", "value"]).to_pandas())
+        Rollups["zones"] = zones.zone_rollups(zones.read_zones())
+    return Rollup_Store(Rollups)
+
+def Serve_Layout():
+    """
+    Layout for each page load. When the last ingestion survived a restart (checked against the manifest
+    without reading the records), the DatePicker opens on its dates and the graphs draw straight away.
+    """
+    Manifest = manifest.validate(query.DATASET_DIR if DATA_BACKEND == "dataset" else None)
+    if Manifest is None or Manifest["First Date Instance"] is None:
+        return Layout
+    if DATA_BACKEND != "dataset":
+        dataset.table() #Republishes the manifest's records if shared memory holds another version
+    First_Date, Last_Date = Manifest["First Date Instance"], Manifest["Last Date Instance"]
+    Page = copy.deepcopy(Layout)
+    Picker = Page["DatePicker"]
+    Picker.disabled = False
+    Picker.start_date, Picker.end_date, Picker.min_date_allowed, Picker.max_date_allowed = First_Date, Last_Date, First_Date, Last_Date
+    Page["Data-Dropdown"].options = Drop_Choices()
+    if CLIENTSIDE_FILTERING:
+        Page["Rollup-Store"].data = Restored_Rollups(Manifest["Dataset Version"])
+    return Page
+
+@callback(Output("DatePicker", "disabled"),
              Output("DatePicker", "start_date"),
              Output("DatePicker", "end_date"),
              Output("DatePicker", "min_date_allowed"),
              Output("DatePicker", "max_date_allowed"),
+             Output("Rollup-Store", "data"),
+             Output("Data-Dropdown", "options"),
             [Input("Upload-Button", "n_clicks")],
             [Input("Upload-Component", "contents")],
             [State("Upload-Component", "filename")])
@@ -269,35 +646,34 @@ def update_output(n_clicks, list_of_contents, list_of_names):
     if list_of_contents is None or list_of_names is None:
         raise PreventUpdate #Only fire when ready
     elif n_clicks > 0:
+            from src.upload import health_xml_to_feather #Deferred, only needed once an upload happens
+
             content_type, content_string = list_of_contents.split(",")
             content_decoded = base64.b64decode(content_string)
             zip_str = io.BytesIO(content_decoded)
-            zip_obj = ZipFile(zip_str, "r")
-            df = health_xml_to_feather(zip_str, "data.feather", remove_zip=True)
-
-            List = df["type"].unique().tolist()
-            Dates = df["startDate"].dt.date.unique()
-            First_Date = Dates.min()
-            Last_Date = Dates.max()
-            return False, First_Date, Last_Date, First_Date, Last_Date
-
-@app.callback(Output("ActiveEnergyGraph", "figure"),
+            df = health_xml_to_feather(zip_str, "data.feather", remove_zip=True, storage=STORAGE_FORMAT)
+            if DATA_BACKEND == "dataset":
+                query.write_dataset(df)
+            else:
+                dataset.publish(df, manifest.version())
+
+            First_Date, Last_Date = manifest.date_bounds()
+
+            Rollups = dash.no_update
+            if Graph_Figures:
+                start_warming(First_Date, Last_Date)
+            if CLIENTSIDE_FILTERING:
+                Rollups = Restored_Rollups(manifest.version())
+            return False, First_Date, Last_Date, First_Date, Last_Date, Rollups, Drop_Choices()
+
+@callback(Output("ActiveEnergyGraph", "figure"),
               [Input("DatePicker", "start_date"),
               Input("DatePicker", "end_date")])  
 def ActiveEnergyGraph(start_date, end_date):
     start_date = datetime.strptime(start_date, "%Y-%m-%d").strftime("%b %d, %Y")
     end_date = datetime.strptime(end_date, "%Y-%m-%d").strftime("%b %d, %Y")
 
-    df = dataframe()
-    df = df[df["type"] == "HKQuantityTypeIdentifierActiveEnergyBurned"]
-    df["startDate"] = df["startDate"].dt.date
-
-    Date_Range = (df["startDate"] > pd.to_datetime(start_date)) & (df["startDate"] <= pd.to_datetime(end_date))
-    Specified_Dates = df.loc[Date_Range]
-
-    By_Day = Specified_Dates.groupby(["startDate"])["value"].sum().reset_index(name = "value")
-    By_Month = Specified_Dates.groupby(["month"])["value"].sum().reset_index(name = "value")
-    By_DayofWeek = Specified_Dates.groupby(["DayofWeek"])["value"].sum().reindex(Order)
+    By_Day, By_Month, By_DayofWeek = Group_Dates("HKQuantityTypeIdentifierActiveEnergyBurned", start_date, end_date, "sum")
     Day_Range = By_Day.startDate.unique().tolist()
     Month_Range = By_Month.month.unique().tolist()
     New_Range = By_DayofWeek.index.unique().tolist()
@@ -362,23 +738,14 @@ def ActiveEnergyGraph(start_date, end_date):
     
     return Figure
 
-@app.callback(Output("BasalEnergyGraph", "figure"),
+@callback(Output("BasalEnergyGraph", "figure"),
               [Input("DatePicker", "start_date"),
               Input("DatePicker", "end_date")])  
 def BasalEnergyGraph(start_date, end_date):
     start_date = datetime.strptime(start_date, "%Y-%m-%d").strftime("%b %d, %Y")
     end_date = datetime.strptime(end_date, "%Y-%m-%d").strftime("%b %d, %Y")
 
-    df = dataframe()
-    df = df[df["type"] == "HKQuantityTypeIdentifierBasalEnergyBurned"]
-    df["startDate"] = df["startDate"].dt.date
-
-    Date_Range = (df["startDate"] > pd.to_datetime(start_date)) & (df["startDate"] <= pd.to_datetime(end_date))
-    Specified_Dates = df.loc[Date_Range]
-
-    By_Day = Specified_Dates.groupby(["startDate"])["value"].sum().reset_index(name= "value")
-    By_Month = Specified_Dates.groupby(["month"])["value"].sum().reset_index(name= "value")
-    By_DayofWeek = Specified_Dates.groupby(["DayofWeek"])["value"].sum().reindex(Order)
+    By_Day, By_Month, By_DayofWeek = Group_Dates("HKQuantityTypeIdentifierBasalEnergyBurned", start_date, end_date, "sum")
     Day_Range = By_Day.startDate.unique().tolist()
     Month_Range = By_Month.month.unique().tolist()
     New_Range = By_DayofWeek.index.unique().tolist()
@@ -443,23 +810,14 @@ def BasalEnergyGraph(start_date, end_date):
     
     return Figure
 
-@app.callback(Output("ExerciseTimeGraph", "figure"),
+@callback(Output("ExerciseTimeGraph", "figure"),
               [Input("DatePicker", "start_date"),
               Input("DatePicker", "end_date")])  
-def BasalEnergyGraph(start_date, end_date):
+def ExerciseTimeGraph(start_date, end_date):
     start_date = datetime.strptime(start_date, "%Y-%m-%d").strftime("%b %d, %Y")
     end_date = datetime.strptime(end_date, "%Y-%m-%d").strftime("%b %d, %Y")
 
-    df = dataframe()
-    df = df[df["type"] == "HKQuantityTypeIdentifierAppleExerciseTime"]
-    df["startDate"] = df["startDate"].dt.date
-
-    Date_Range = (df["startDate"] > pd.to_datetime(start_date)) & (df["startDate"] <= pd.to_datetime(end_date))
-    Specified_Dates = df.loc[Date_Range]
-
-    By_Day = Specified_Dates.groupby(["startDate"])["value"].sum().reset_index(name= "value")
-    By_Month = Specified_Dates.groupby(["month"])["value"].sum().reset_index(name= "value")
-    By_DayofWeek = Specified_Dates.groupby(["DayofWeek"])["value"].sum().reindex(Order)
+    By_Day, By_Month, By_DayofWeek = Group_Dates("HKQuantityTypeIdentifierAppleExerciseTime", start_date, end_date, "sum")
     Day_Range = By_Day.startDate.unique().tolist()
     Month_Range = By_Month.month.unique().tolist()
     New_Range = By_DayofWeek.index.unique().tolist()
@@ -524,23 +882,14 @@ def BasalEnergyGraph(start_date, end_date):
     
     return Figure
 
-@app.callback(Output("StandTimeGraph", "figure"),
+@callback(Output("StandTimeGraph", "figure"),
               [Input("DatePicker", "start_date"),
               Input("DatePicker", "end_date")])  
 def StandTimeGraph(start_date, end_date):
     start_date = datetime.strptime(start_date, "%Y-%m-%d").strftime("%b %d, %Y")
     end_date = datetime.strptime(end_date, "%Y-%m-%d").strftime("%b %d, %Y")
 
-    df = dataframe()
-    df = df[df["type"] == "HKQuantityTypeIdentifierAppleStandTime"]
-    df["startDate"] = df["startDate"].dt.date
-
-    Date_Range = (df["startDate"] > pd.to_datetime(start_date)) & (df["startDate"] <= pd.to_datetime(end_date))
-    Specified_Dates = df.loc[Date_Range]
-
-    By_Day = Specified_Dates.groupby(["startDate"])["value"].sum().reset_index(name= "value")
-    By_Month = Specified_Dates.groupby(["month"])["value"].sum().reset_index(name= "value")
-    By_DayofWeek = Specified_Dates.groupby(["DayofWeek"])["value"].sum().reindex(Order)
+    By_Day, By_Month, By_DayofWeek = Group_Dates("HKQuantityTypeIdentifierAppleStandTime", start_date, end_date, "sum")
     Day_Range = By_Day.startDate.unique().tolist()
     Month_Range = By_Month.month.unique().tolist()
     New_Range = By_DayofWeek.index.unique().tolist()
@@ -605,23 +954,14 @@ def StandTimeGraph(start_date, end_date):
     
     return Figure
 
-@app.callback(Output("StepCountGraph", "figure"),
+@callback(Output("StepCountGraph", "figure"),
               [Input("DatePicker", "start_date"),
               Input("DatePicker", "end_date")])  
 def StepCountGraph(start_date, end_date):
     start_date = datetime.strptime(start_date, "%Y-%m-%d").strftime("%b %d, %Y")
     end_date = datetime.strptime(end_date, "%Y-%m-%d").strftime("%b %d, %Y")
 
-    df = dataframe()
-    df = df[df["type"] == "HKQuantityTypeIdentifierStepCount"]
-    df["startDate"] = df["startDate"].dt.date
-
-    Date_Range = (df["startDate"] > pd.to_datetime(start_date)) & (df["startDate"] <= pd.to_datetime(end_date))
-    Specified_Dates = df.loc[Date_Range]
-
-    By_Day = Specified_Dates.groupby(["startDate"])["value"].sum().reset_index(name= "value")
-    By_Month = Specified_Dates.groupby(["month"])["value"].sum().reset_index(name= "value")
-    By_DayofWeek = Specified_Dates.groupby(["DayofWeek"])["value"].sum().reindex(Order)
+    By_Day, By_Month, By_DayofWeek = Group_Dates("HKQuantityTypeIdentifierStepCount", start_date, end_date, "sum")
     Day_Range = By_Day.startDate.unique().tolist()
     Month_Range = By_Month.month.unique().tolist()
     New_Range = By_DayofWeek.index.unique().tolist()
@@ -654,7 +994,24 @@ def StepCountGraph(start_date, end_date):
         marker_color = Attribute_Color,
         visible = False)
 
-    Graphs = [Day, Month, Weekday]
+    #Trailing averages from the running daily totals, no extra scan of the samples
+    Trends = []
+    for Window, Dash_Style in [(7, "dot"), (30, "dash")]:
+        Trend = prefix.rolling_average("HKQuantityTypeIdentifierStepCount", start_date, end_date, Window)
+        if Trend is not None:
+            Trends.append(go.Scatter(
+                x = Trend.index,
+                y = Trend.values,
+                name = f"{Window} Day Average",
+                mode = "lines",
+                line = {"dash" : Dash_Style, "width" : 2},
+                marker_color = "white",
+                visible = True))
+
+    Graphs = [Day, Month, Weekday] + Trends
+    Trend_Shown = [True] * len(Trends)
+    Trend_Hidden = [False] * len(Trends)
+    Trend_Range = [list(Trend.x) for Trend in Trends]
 
     updatemenus = [
         {"active" : 0, 
@@ -665,17 +1022,17 @@ def StepCountGraph(start_date, end_date):
         "showactive" : True,
         "buttons" : [
             {"label" : "Total Per Day", "method" : "update", "args" : [
-                {"visible" : [True, False, False], "x" : [Day_Range]},
+                {"visible" : [True, False, False] + Trend_Shown, "x" : [Day_Range, Month_Range, New_Range] + Trend_Range},
                 {"title" : f"Total Step Count Per Day from {start_date} to {end_date}", "yaxis.title.text" : "Count"}]
             },
 
             {"label" : "Total Per Month", "method" : "update", "args" : [
-                {"visible" : [False, True, False], "x" : [Month_Range]},
+                {"visible" : [False, True, False] + Trend_Hidden, "x" : [Month_Range] * len(Graphs)},
                 {"title" : f"Total Step Count Per Month from {start_date} to {end_date}", "yaxis.title.text" : "Count"}]
             },
             
             {"label" : "Total Per Weekday", "method" : "update", "args" : [
-                {"visible" : [False, False, True], "x" : [New_Range]},
+                {"visible" : [False, False, True] + Trend_Hidden, "x" : [New_Range] * len(Graphs)},
                 {"title" : f"Total Step Count Per Weekday from {start_date} to {end_date}", "yaxis.title.text" : "Count", "xaxis.dtick" : "M1", "xaxis.showgrid" : True}
             ]}]
         }]
@@ -686,23 +1043,14 @@ def StepCountGraph(start_date, end_date):
     
     return Figure
 
-@app.callback(Output("FlightsClimbedGraph", "figure"),
+@callback(Output("FlightsClimbedGraph", "figure"),
               [Input("DatePicker", "start_date"),
               Input("DatePicker", "end_date")])  
 def FlightsClimbedGraph(start_date, end_date):
     start_date = datetime.strptime(start_date, "%Y-%m-%d").strftime("%b %d, %Y")
     end_date = datetime.strptime(end_date, "%Y-%m-%d").strftime("%b %d, %Y")
 
-    df = dataframe()
-    df = df[df["type"] == "HKQuantityTypeIdentifierFlightsClimbed"]
-    df["startDate"] = df["startDate"].dt.date
-
-    Date_Range = (df["startDate"] > pd.to_datetime(start_date)) & (df["startDate"] <= pd.to_datetime(end_date))
-    Specified_Dates = df.loc[Date_Range]
-
-    By_Day = Specified_Dates.groupby(["startDate"])["value"].sum().reset_index(name= "value")
-    By_Month = Specified_Dates.groupby(["month"])["value"].sum().reset_index(name= "value")
-    By_DayofWeek = Specified_Dates.groupby(["DayofWeek"])["value"].sum().reindex(Order)
+    By_Day, By_Month, By_DayofWeek = Group_Dates("HKQuantityTypeIdentifierFlightsClimbed", start_date, end_date, "sum")
     Day_Range = By_Day.startDate.unique().tolist()
     Month_Range = By_Month.month.unique().tolist()
     New_Range = By_DayofWeek.index.unique().tolist()
@@ -767,23 +1115,14 @@ def FlightsClimbedGraph(start_date, end_date):
     
     return Figure
 
-@app.callback(Output("DistanceWalkingRunningGraph", "figure"), 
+@callback(Output("DistanceWalkingRunningGraph", "figure"), 
               [Input("DatePicker", "start_date"),
               Input("DatePicker", "end_date")])
 def DistanceWalkingRunningGraph(start_date, end_date):
     start_date = datetime.strptime(start_date, "%Y-%m-%d").strftime("%b %d, %Y")
     end_date = datetime.strptime(end_date, "%Y-%m-%d").strftime("%b %d, %Y")
 
-    df = dataframe()
-    df = df[df["type"] == "HKQuantityTypeIdentifierDistanceWalkingRunning"]
-    df["startDate"] = df["startDate"].dt.date
-
-    Date_Range = (df["startDate"] > pd.to_datetime(start_date)) & (df["startDate"] <= pd.to_datetime(end_date))
-    Specified_Dates = df.loc[Date_Range]
-
-    By_Day = Specified_Dates.groupby(["startDate"])["value"].sum().reset_index(name= "value")
-    By_Month = Specified_Dates.groupby(["month"])["value"].sum().reset_index(name= "value")
-    By_DayofWeek = Specified_Dates.groupby(["DayofWeek"])["value"].sum().reindex(Order)
+    By_Day, By_Month, By_DayofWeek = Group_Dates("HKQuantityTypeIdentifierDistanceWalkingRunning", start_date, end_date, "sum")
     Day_Range = By_Day.startDate.unique().tolist()
     Month_Range = By_Month.month.unique().tolist()
     New_Range = By_DayofWeek.index.unique().tolist()
@@ -848,7 +1187,7 @@ def DistanceWalkingRunningGraph(start_date, end_date):
     
     return Figure
 
-@app.callback(Output("EnvironmentalAudioExposureGraph", "figure"), 
+@callback(Output("EnvironmentalAudioExposureGraph", "figure"), 
               [Input("DatePicker", "start_date"),
               Input("DatePicker", "end_date")])  
 def EnvironmentalAudioExposureGraph(start_date, end_date):
@@ -856,21 +1195,12 @@ def EnvironmentalAudioExposureGraph(start_date, end_date):
     start_date = datetime.strptime(start_date, "%Y-%m-%d").strftime("%b %d, %Y")
     end_date = datetime.strptime(end_date, "%Y-%m-%d").strftime("%b %d, %Y")
 
-    df = dataframe()
-    df = df[df["type"] == "HKQuantityTypeIdentifierEnvironmentalAudioExposure"]
-    if df.empty:
+    if not has_data("HKQuantityTypeIdentifierEnvironmentalAudioExposure"):
         Message = copy.deepcopy(No_Data_Graph_Message)
         Message["layout"]["annotations"][0]["text"] = "Watch does not record Enviornmental Audio Exposure"
         return go.Figure(data = Message)
     else:
-        df["startDate"] = df["startDate"].dt.date
-
-        Date_Range = (df["startDate"] > pd.to_datetime(start_date)) & (df["startDate"] <= pd.to_datetime(end_date))
-        Specified_Dates = df.loc[Date_Range]
-
-        By_Day = Specified_Dates.groupby(["startDate"])["value"].mean().reset_index(name= "value")
-        By_Month = Specified_Dates.groupby(["month"])["value"].mean().reset_index(name= "value")
-        By_DayofWeek = Specified_Dates.groupby(["DayofWeek"])["value"].mean().reindex(Order)
+        By_Day, By_Month, By_DayofWeek = Group_Dates("HKQuantityTypeIdentifierEnvironmentalAudioExposure", start_date, end_date, "mean")
         Day_Range = By_Day.startDate.unique().tolist()
         Month_Range = By_Month.month.unique().tolist()
         New_Range = By_DayofWeek.index.unique().tolist()
@@ -903,7 +1233,9 @@ def EnvironmentalAudioExposureGraph(start_date, end_date):
             marker_color = Attribute_Color,
             visible = False)
 
-        Graphs = [Day, Month, Weekday]
+        Bands = Percentile_Bands("HKQuantityTypeIdentifierEnvironmentalAudioExposure", start_date, end_date, "Decibles", Attribute_Color)
+        Graphs = [Day, Month, Weekday] + [Trace for Traces in Bands.values() for Trace in Traces]
+        Hidden = [False] * (len(Graphs) - 3)
 
         updatemenus = [
             {"active" : 0, 
@@ -914,19 +1246,19 @@ def EnvironmentalAudioExposureGraph(start_date, end_date):
             "showactive" : True,
             "buttons" : [
                 {"label" : "Average Per Day", "method" : "update", "args" : [
-                    {"visible" : [True, False, False], "x" : [Day_Range]},
+                    {"visible" : [True, False, False] + Hidden, "x" : [Day_Range]},
                     {"title" : f"Average Decibles Exposure Per Day from {start_date} to {end_date}", "yaxis.title.text" : "Decibles"}]
                 },
 
                 {"label" : "Average Per Month", "method" : "update", "args" : [
-                    {"visible" : [False, True, False], "x" : [Month_Range]},
+                    {"visible" : [False, True, False] + Hidden, "x" : [Month_Range]},
                     {"title" : f"Average Decible Exposure Per Month from {start_date} to {end_date}", "yaxis.title.text" : "Decibles"}]
                 },
                 
                 {"label" : "Average Per Weekday", "method" : "update", "args" : [
-                    {"visible" : [False, False, True], "x" : [New_Range]},
+                    {"visible" : [False, False, True] + Hidden, "x" : [New_Range]},
                     {"title" : f"Average Decible Exposure Per Weekday from {start_date} to {end_date}", "yaxis.title.text" : "Decibles", "xaxis.dtick" : "M1", "xaxis.showgrid" : True}
-                ]}]
+                ]}] + Percentile_Buttons(Graphs, Bands, "Decible Exposure", start_date, end_date, "Decibles")
             }]
 
 
@@ -935,32 +1267,31 @@ def EnvironmentalAudioExposureGraph(start_date, end_date):
         
         return Figure
 
-@app.callback(Output("HeartRateGraph", "figure"), 
+@callback(Output("HeartRateGraph", "figure"), 
               [Input("DatePicker", "start_date"),
-              Input("DatePicker", "end_date")])  
-def HeartRateGraph(start_date, end_date):
+              Input("DatePicker", "end_date"),
+              Input("HeartRateGraph", "relayoutData")])  
+def HeartRateGraph(start_date, end_date, relayoutData = None):
+    Window = Zoom_Window(start_date, end_date, relayoutData)
     start_date = datetime.strptime(start_date, "%Y-%m-%d").strftime("%b %d, %Y")
     end_date = datetime.strptime(end_date, "%Y-%m-%d").strftime("%b %d, %Y")
 
-    df = dataframe()
-    df = df[df["type"] == "HKQuantityTypeIdentifierHeartRate"]
-    df["startDate"] = df["startDate"].dt.date
-
-    Date_Range = (df["startDate"] > pd.to_datetime(start_date)) & (df["startDate"] <= pd.to_datetime(end_date))
-    Specified_Dates = df.loc[Date_Range]
-
-    By_Day_High = Specified_Dates.groupby(["startDate"])["value"].max().reset_index(name = "value")
-    By_Day_Low = Specified_Dates.groupby(["startDate"])["value"].min().reset_index(name = "value")
-
-    # By_Month = df.groupby(["month"])["value"].reset_index(name= "value")
-    By_DayofWeek = df.groupby(["DayofWeek"])["value"].sum().reindex(Order)
-    Day_Range = By_Day_High.startDate.unique().tolist()
-    Month_Range = df["month"].unique().tolist()
-    New_Range = By_DayofWeek.index.unique().tolist()
-
     Graph_Layout = copy.deepcopy(layout)
+    Graph_Layout["uirevision"] = f"{start_date}-{end_date}" #Keep the user's zoom across redraws
+
+    # Zooming swaps in a finer pyramid level, so every redraw costs at most MAX_POINTS buckets
+    Level = pyramid.choose_level(*Window)
+    Levels = pyramid.read_level("HKQuantityTypeIdentifierHeartRate", Level, *Window)
+    if Levels is not None:
+        By_Day_High = pd.DataFrame({"startDate" : Levels["time"], "value" : Levels["max"]})
+        By_Day_Low = pd.DataFrame({"startDate" : Levels["time"], "value" : Levels["min"]})
+        Graph_Layout["title"] = f"Highest and Lowest Heart Rate per {Level} from {start_date} to {end_date}"
+        Graph_Layout["xaxis"]["range"] = [str(Window[0]), str(Window[1])]
+    else:
+        By_Day_High = Group_Dates("HKQuantityTypeIdentifierHeartRate", start_date, end_date, "max")[0]
+        By_Day_Low = Group_Dates("HKQuantityTypeIdentifierHeartRate", start_date, end_date, "min")[0]
+        Graph_Layout["title"] = f"Highest and Lowest Heart Rate from {start_date} to {end_date}"
 
-    Graph_Layout["title"] = f"Highest and Lowest Heart Rate from {start_date} to {end_date}"
     Graph_Layout["yaxis"]["title"]["text"] = "Count/Min"
     #[By_Day_High.value, By_Day_Low.value],
     Day_High = go.Scatter(
@@ -981,40 +1312,90 @@ def HeartRateGraph(start_date, end_date):
         marker_color = Heart_Low_Color,
         visible = True)
 
-    Month = go.Scattergl(
-        x = Specified_Dates.month,
-        y = Specified_Dates.values,
-        name = "Miles",
-        marker_color = Attribute_Color,
-        visible = False)
+    Bands = Percentile_Bands("HKQuantityTypeIdentifierHeartRate", start_date, end_date, "CPM", Heart_High_Color)
+    Graphs = [Day_High,Day_Low] + [Trace for Traces in Bands.values() for Trace in Traces]
 
-    Weekday = go.Bar(
-        x = By_DayofWeek.index,
-        y = By_DayofWeek.values,
-        name = "Miles",
-        marker_color = Attribute_Color,
-        visible = False)
+    updatemenus = []
+    if Bands:
+        updatemenus = [
+            {"active" : 0, 
+            "direction" : "down", 
+            "pad" : {"r" : 4, "t" : 0}, 
+            "x" : 0.93,
+            "y" : 1.2,
+            "showactive" : True,
+            "buttons" : [
+                {"label" : "Highest and Lowest", "method" : "update", "args" : [
+                    {"visible" : [True, True] + [False] * (len(Graphs) - 2), "x" : [Trace.x for Trace in Graphs]},
+                    {"title" : Graph_Layout["title"], "yaxis.title.text" : "Count/Min"}]
+                }] + Percentile_Buttons(Graphs, Bands, "Heart Rate", start_date, end_date, "Count/Min")
+            }]
+
+    Figure = go.Figure(data = Graphs)
+    Figure.update_layout(Graph_Layout, showlegend = False, updatemenus = updatemenus)
+    
+    return Figure
+
+@callback(Output("HeartRateZoneGraph", "figure"), 
+              [Input("DatePicker", "start_date"),
+              Input("DatePicker", "end_date")])  
+def HeartRateZoneGraph(start_date, end_date):
+    start_date = datetime.strptime(start_date, "%Y-%m-%d").strftime("%b %d, %Y")
+    end_date = datetime.strptime(end_date, "%Y-%m-%d").strftime("%b %d, %Y")
+
+    Zones = zones.zone_minutes(start_date, end_date)
+    if Zones is None:
+        return go.Figure(No_Data_Graph_Message)
+    Groups, Max_HR = Zones
+
+    Graph_Layout = copy.deepcopy(layout)
+    Names = {"startDate" : "Day", "month" : "Month", "DayofWeek" : "Weekday"}
+    Title = "Minutes in Heart Rate Zone Per {} from " + f"{start_date} to {end_date} (max {Max_HR:.0f} CPM)"
+    Graph_Layout["title"] = Title.format("Day")
+    Graph_Layout["yaxis"]["title"]["text"] = "Minutes"
+
+    Graphs = []
+    Shown = {}
+    for By, Group in Groups.items():
+        Shown[By] = []
+        for Zone, Color in zip(Group.columns, Zone_Colors):
+            Shown[By].append(len(Graphs))
+            Graphs.append(go.Bar(
+                x = Group.index.tolist(),
+                y = Group[Zone],
+                name = Zone,
+                marker_color = Color,
+                legendgroup = Zone,
+                showlegend = By == "startDate",
+                visible = By == "startDate"))
 
-    Graphs = [Day_High,Day_Low]
+    updatemenus = [
+        {"active" : 0, 
+        "direction" : "down", 
+        "pad" : {"r" : 4, "t" : 0}, 
+        "x" : 0.93,
+        "y" : 1.2,
+        "showactive" : True,
+        "buttons" : [
+            {"label" : f"Zones Per {Names[By]}", "method" : "update", "args" : [
+                {"visible" : [i in Indexes for i in range(len(Graphs))], "x" : [Trace.x for Trace in Graphs]},
+                {"title" : Title.format(Names[By]), "yaxis.title.text" : "Minutes"}]
+            } for By, Indexes in Shown.items()]
+        }]
 
     Figure = go.Figure(data = Graphs)
-    Figure.update_layout(Graph_Layout, showlegend = False)
+    Figure.update_layout(Graph_Layout, barmode = "stack", updatemenus = updatemenus)
     
     return Figure
 
-@app.callback(Output("WalkingHeartRateAverageGraph", "figure"), 
+@callback(Output("WalkingHeartRateAverageGraph", "figure"), 
               [Input("DatePicker", "start_date"),
               Input("DatePicker", "end_date")])  
 def WalkingHeartRateAverageGraph(start_date, end_date):
     start_date = datetime.strptime(start_date, "%Y-%m-%d").strftime("%b %d, %Y")
     end_date = datetime.strptime(end_date, "%Y-%m-%d").strftime("%b %d, %Y")
 
-    df = dataframe()
-    df = df[df["type"] == "HKQuantityTypeIdentifierWalkingHeartRateAverage"]
-    df["startDate"] = df["startDate"].dt.date
-
-    Date_Range = (df["startDate"] > pd.to_datetime(start_date)) & (df["startDate"] <= pd.to_datetime(end_date))
-    Specified_Dates = df.loc[Date_Range]
+    Specified_Dates = Group_Dates("HKQuantityTypeIdentifierWalkingHeartRateAverage", start_date, end_date, "mean")[0]
 
     Graph_Layout = copy.deepcopy(layout)
 
@@ -1037,19 +1418,14 @@ def WalkingHeartRateAverageGraph(start_date, end_date):
     
     return Figure
 
-@app.callback(Output("RestingHeartRateAverageGraph", "figure"), 
+@callback(Output("RestingHeartRateAverageGraph", "figure"), 
               [Input("DatePicker", "start_date"),
               Input("DatePicker", "end_date")])  
 def RestingHeartRateAverageGraph(start_date, end_date):
     start_date = datetime.strptime(start_date, "%Y-%m-%d").strftime("%b %d, %Y")
     end_date = datetime.strptime(end_date, "%Y-%m-%d").strftime("%b %d, %Y")
 
-    df = dataframe()
-    df = df[df["type"] == "HKQuantityTypeIdentifierRestingHeartRate"]
-    df["startDate"] = df["startDate"].dt.date
-
-    Date_Range = (df["startDate"] > pd.to_datetime(start_date)) & (df["startDate"] <= pd.to_datetime(end_date))
-    Specified_Dates = df.loc[Date_Range]
+    Specified_Dates = Group_Dates("HKQuantityTypeIdentifierRestingHeartRate", start_date, end_date, "mean")[0]
 
     Graph_Layout = copy.deepcopy(layout)
 
@@ -1070,21 +1446,14 @@ def RestingHeartRateAverageGraph(start_date, end_date):
     
     return Figure
 
-@app.callback(Output("HeartRateVariabilityGraph", "figure"), 
+@callback(Output("HeartRateVariabilityGraph", "figure"), 
               [Input("DatePicker", "start_date"),
               Input("DatePicker", "end_date")])  
 def HeartRateVariabilityGraph(start_date, end_date):
     start_date = datetime.strptime(start_date, "%Y-%m-%d").strftime("%b %d, %Y")
     end_date = datetime.strptime(end_date, "%Y-%m-%d").strftime("%b %d, %Y")
 
-    df = dataframe()
-    df = df[df["type"] == "HKQuantityTypeIdentifierHeartRateVariabilitySDNN"] 
-    df["startDate"] = df["startDate"].dt.date
-
-    Date_Range = (df["startDate"] > pd.to_datetime(start_date)) & (df["startDate"] <= pd.to_datetime(end_date))
-    Specified_Dates = df.loc[Date_Range]
-
-    Average_Per_Day = Specified_Dates.groupby(["startDate"])["value"].mean().reset_index(name = "value")
+    Average_Per_Day = Group_Dates("HKQuantityTypeIdentifierHeartRateVariabilitySDNN", start_date, end_date, "mean")[0]
 
     Graph_Layout = copy.deepcopy(layout)
 
@@ -1104,8 +1473,8 @@ def HeartRateVariabilityGraph(start_date, end_date):
     return Figure
 
 if __name__ == "__main__":
+    app = create_app()
     app.scripts.config.serve_locally = True
     app.css.config.serve_locally = True
     app.run_server(debug = True)
-    dash_resumable_upload(app.server)
-    
+
@@ -0,0 +1,94 @@
+"""
+Offline batch ingestion, builds the same files an upload through the dashboard does.
+    python -m src ingest exports/*.zip --out datasets --workers 4
+
+Every export gets its own <out>/<zip name>/Data directory, start the dashboard from there to serve it.
+"""
+import os
+import io
+import sys
+import time
+import zipfile
+import argparse
+import contextlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import pandas as pd
+from src.storage import STORAGE_FORMATS
+from src.upload import XML_PATH, health_xml_to_feather
+from src.spill import type_frames
+from src import query
+
+
+def ingest(zip_path, root, storage="feather", dataset=False, verbose=False, memory_budget=None):
+    """
+    Ingests one export into root/Data. Runs in a pool process, which owns its working directory
+    for the length of the job since every ingestion path is relative to it.
+    """
+    start = time.perf_counter()
+    os.makedirs(os.path.join(root, "Data"), exist_ok=True)
+    os.chdir(root)
+    Log = io.StringIO()
+    with contextlib.redirect_stdout(sys.stdout if verbose else Log):
+        df = health_xml_to_feather(zip_path, "data.feather", storage=storage, memory_budget=memory_budget)
+        if dataset:
+            query.write_dataset(type_frames(df))
+
+    with zipfile.ZipFile(zip_path, "r") as f:
+        XML_MB = f.getinfo(XML_PATH).file_size / 1e6
+    return {"export" : os.path.basename(root), "rows" : len(df), "zip MB" : os.path.getsize(zip_path) / 1e6,
+        "xml MB" : XML_MB, "seconds" : time.perf_counter() - start}
+
+
+def ingest_all(zip_paths, out, workers=None, storage="feather", dataset=False, verbose=False, memory_budget=None):
+    Jobs = {}
+    for zip_path in zip_paths:
+        root = os.path.join(os.path.abspath(out), os.path.splitext(os.path.basename(zip_path))[0])
+        if root in Jobs.values():
+            raise ValueError(f"Two exports would both be written to {root}, rename one of them")
+        Jobs[os.path.abspath(zip_path)] = root
+
+    start = time.perf_counter()
+    Results = []
+    Failed = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        Futures = {pool.submit(ingest, zip_path, root, storage, dataset, verbose, memory_budget) : zip_path for zip_path, root in Jobs.items()}
+        for future in as_completed(Futures):
+            try:
+                Result = future.result()
+            except Exception as e:
+                print(f"{Futures[future]} failed: {e}")
+                Failed.append(Futures[future])
+                continue
+            Results.append(Result)
+            print(f"{Result['export']}: {Result['rows']} rows from {Result['xml MB']:.1f} MB of XML in {Result['seconds']:.2f}s")
+    Wall = time.perf_counter() - start
+
+    if Results:
+        Table = pd.DataFrame(Results).set_index("export")
+        print(Table.round(2).to_string())
+        Total = Table.sum()
+        print(f"{len(Results)} exports, {int(Total['rows'])} rows, {Total['xml MB']:.1f} MB of XML in {Wall:.2f}s wall: "
+            f"{Total['rows'] / Wall:.0f} rows/s, {Total['xml MB'] / Wall:.1f} MB/s, {len(Results) / Wall:.2f} exports/s")
+    return Results, Failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog = "python -m src", description = "Apple Health export tools")
+    commands = parser.add_subparsers(dest = "command", required = True)
+    ingest_parser = commands.add_parser("ingest", help = "Build datasets from export ZIPs in parallel")
+    ingest_parser.add_argument("zips", nargs = "+", help = "Apple Health export.zip files")
+    ingest_parser.add_argument("--out", default = "datasets", help = "One sub directory per export is written here")
+    ingest_parser.add_argument("--workers", type = int, default = None, help = "Pool processes, defaults to the CPU count")
+    ingest_parser.add_argument("--storage", choices = list(STORAGE_FORMATS), default = "feather")
+    ingest_parser.add_argument("--dataset", action = "store_true", help = "Also write the partitioned Parquet dataset for DATA_BACKEND=dataset")
+    ingest_parser.add_argument("--verbose", action = "store_true", help = "Show each export's per-stage ingestion counters")
+    ingest_parser.add_argument("--memory-budget", type = int, default = None,
+        help = "MB each export may hold while parsing, past it records are spilled to disk and merged. Rerun to resume a killed job")
+    args = parser.parse_args()
+
+    if args.command == "ingest":
+        try:
+            Results, Failed = ingest_all(args.zips, args.out, args.workers, args.storage, args.dataset, args.verbose, args.memory_budget)
+        except ValueError as e:
+            parser.error(str(e))
+        sys.exit(1 if Failed else 0)
@@ -0,0 +1,162 @@
+"""
+Micro benchmarks for the ingestion and storage paths.
+    python -m src.bench storage --rows 1000000
+    python -m src.bench intervals --rows 20000000
+    python -m src.bench calendar --rows 10000000
+"""
+import os
+import time
+import argparse
+import warnings
+import tempfile
+import numpy as np
+import pandas as pd
+from src.options import Get_Drop_Choices
+from src.storage import STORAGE_FORMATS, write_records, read_records
+from src.intervals import split_intervals, HOUR, DAY
+from src.timestamps import DAY_NAMES, parse_timestamps, calendar_fields, month_labels, wall_clock
+
+
+def synthetic_records(rows, days=3 * 365, seed=0):
+    # Shaped like the ingested records table, samples spread evenly over the days
+    rng = np.random.default_rng(seed)
+    Types = [Choice["value"] for Choice in Get_Drop_Choices()]
+    start = pd.Timestamp("2018-01-01")
+    startDate = start + pd.to_timedelta(np.sort(rng.integers(0, days * 86400, rows)), unit="s")
+    return pd.DataFrame({
+        "type" : pd.Categorical.from_codes(rng.integers(0, len(Types), rows), Types).astype(str),
+        "sourceName" : "Apple Watch",
+        "month" : startDate.strftime("%Y-%m"),
+        "day" : startDate.day,
+        "year" : startDate.year,
+        "hour" : startDate.hour,
+        "DayofWeek" : startDate.day_name(),
+        "startDate" : startDate,
+        "endDate" : startDate + pd.Timedelta(minutes=1),
+        "utcOffset" : np.int16(-300),
+        "value" : rng.gamma(2.0, 20.0, rows),
+        "unit" : "count"})
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def bench_storage(df, days=30):
+    """
+    File size, write time and the time to read one type over the last `days` days, per storage format.
+    """
+    Type = df["type"].iloc[0]
+    end = df["startDate"].max()
+    start = end - pd.Timedelta(days=days)
+    Results = []
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        for storage, extension in STORAGE_FORMATS.items():
+            path = os.path.join(tmpdirname, f"data{extension}")
+            _, write_time = timed(write_records, df, path, storage)
+            Table, read_time = timed(read_records, path, Type, start, end)
+            Results.append({"format" : storage, "size MB" : os.path.getsize(path) / 1e6, "write s" : write_time,
+                "range read s" : read_time, "rows read" : Table.num_rows})
+    return pd.DataFrame(Results).set_index("format")
+
+
+def bench_intervals(rows, seed=0):
+    """
+    Time to split `rows` intervals of up to 3 hours across hour and day buckets and total each bucket.
+    """
+    rng = np.random.default_rng(seed)
+    starts = np.sort(rng.integers(1_500_000_000, 1_600_000_000, rows))
+    ends = starts + rng.integers(0, 3 * 3600, rows)
+    values = rng.random(rows)
+    Results = []
+    for name, width in [("day", DAY), ("hour", HOUR)]:
+        def split_and_total():
+            row, bucket, fraction = split_intervals(starts, ends, width)
+            return len(row), np.bincount(bucket - bucket.min(), weights=values[row] * fraction)
+        (pieces, totals), seconds = timed(split_and_total)
+        Results.append({"bucket" : name, "pieces" : pieces, "seconds" : seconds, "M intervals/s" : rows / seconds / 1e6,
+            "total preserved" : bool(np.isclose(totals.sum(), values.sum()))})
+    return pd.DataFrame(Results).set_index("bucket")
+
+
+def timestamp_strings(rows, offsets, days=3 * 365, seed=0, chunk_rows=1_000_000):
+    # export.xml style "2020-03-01 10:00:00 -0500" strings, each in an offset (minutes) picked at random
+    rng = np.random.default_rng(seed)
+    Dates = pd.DatetimeIndex(pd.Timestamp("2018-01-01") + pd.to_timedelta(np.sort(rng.integers(0, days * 86400, rows)), unit="s"))
+    Offset = rng.choice(np.asarray(offsets), rows)
+    Chars = np.full((rows, 25), ord(" "), dtype=np.uint8)
+    for first, Value, width in [(0, Dates.year, 4), (5, Dates.month, 2), (8, Dates.day, 2), (11, Dates.hour, 2), (14, Dates.minute, 2),
+            (17, Dates.second, 2), (21, np.abs(Offset) // 60, 2), (23, np.abs(Offset) % 60, 2)]:
+        Value = np.asarray(Value)
+        for i in reversed(range(width)):
+            Chars[:, first + i] = 48 + Value % 10
+            Value = Value // 10
+    for column, separator in [(4, "-"), (7, "-"), (13, ":"), (16, ":")]:
+        Chars[:, column] = ord(separator)
+    Chars[:, 20] = np.where(Offset < 0, ord("-"), ord("+"))
+    Strings = np.empty(rows, dtype=object)
+    for start in range(0, rows, chunk_rows):
+        Strings[start:start + chunk_rows] = Chars[start:start + chunk_rows].view("S25").ravel().astype(str)
+    return Strings
+
+
+def pandas_calendar(Strings):
+    # The chain ingestion used before: inferred to_datetime, then one .dt accessor per column
+    Dates = pd.to_datetime(pd.Series(Strings))
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore") #to_period drops the time zone, as intended
+        Months = Dates.dt.to_period("M").map(str).values
+    return {"startDate" : Dates.dt.tz_localize(None).values, "year" : Dates.dt.year.values, "month" : Months,
+        "day" : Dates.dt.day.values, "hour" : Dates.dt.hour.values, "DayofWeek" : Dates.dt.day_name().values}
+
+
+def vectorized_calendar(Strings):
+    # What convert_records does now
+    Local, _, _ = parse_timestamps(Strings)
+    Year, Month, Day, Hour, Weekday = calendar_fields(Local)
+    return {"startDate" : wall_clock(Local), "year" : Year, "month" : month_labels(Year, Month), "day" : Day, "hour" : Hour,
+        "DayofWeek" : DAY_NAMES[Weekday]}
+
+
+def bench_calendar(rows, seed=0, sample_rows=10_000):
+    """
+    Time to turn `rows` date strings into the wall clock and calendar columns, vectorized and through the pandas chain.
+    With mixed offsets to_datetime falls back to parsing row by row into objects and .dt then fails,
+    so there the chain only runs on the first sample_rows to show that it does.
+    """
+    Results = []
+    for name, offsets in [("one offset", [-300]), ("mixed offsets", [-300, -240, 60, 330])]:
+        Strings = timestamp_strings(rows, offsets, seed=seed)
+        New, new_seconds = timed(vectorized_calendar, Strings)
+        Row = {"offsets" : name, "vectorized s" : new_seconds, "M rows/s" : rows / new_seconds / 1e6, "pandas chain s" : np.nan, "speedup" : np.nan}
+        if len(offsets) == 1:
+            Old, old_seconds = timed(pandas_calendar, Strings)
+            Row.update({"pandas chain s" : old_seconds, "speedup" : old_seconds / new_seconds,
+                "same columns" : all(np.array_equal(New[key], Old[key]) for key in New)})
+            del Old
+        else:
+            try:
+                pandas_calendar(Strings[:sample_rows])
+                Row["same columns"] = "chain ran"
+            except AttributeError:
+                Row["same columns"] = "chain fails"
+        del New, Strings
+        Results.append(Row)
+    return pd.DataFrame(Results).set_index("offsets")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Storage and ingestion benchmarks")
+    parser.add_argument("bench", choices = ["storage", "intervals", "calendar"])
+    parser.add_argument("--rows", type = int, default = 1_000_000)
+    parser.add_argument("--days", type = int, default = 30, help = "Width of the range read")
+    args = parser.parse_args()
+
+    if args.bench == "storage":
+        print(bench_storage(synthetic_records(args.rows), args.days).round(3).to_string())
+    elif args.bench == "intervals":
+        print(bench_intervals(args.rows).round(3).to_string())
+    elif args.bench == "calendar":
+        print(bench_calendar(args.rows).round(3).to_string())
@@ -0,0 +1,90 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from pyarrow import feather
+from src.timestamps import parse_timestamps
+from src.intervals import split_intervals, DAY
+
+CATEGORY_FILE = "Data/categories.feather"
+# Category records carry a label instead of a number, so to_numeric would drop them from the records table
+CATEGORY_TYPES = ["HKCategoryTypeIdentifierSleepAnalysis", "HKCategoryTypeIdentifierAppleStandHour"]
+CATEGORY_KEYS = ["type", "value", "startDate", "endDate"]
+
+
+def category_frame(rows):
+    """
+    Category record rows as type and value categories and int64 start/end, seconds of local wall time
+    both in the offset of the start.
+    """
+    df = pd.DataFrame(rows, columns=CATEGORY_KEYS)
+    Start, Offset, Start_Valid = parse_timestamps(df["startDate"].values)
+    End, End_Offset, End_Valid = parse_timestamps(df["endDate"].values)
+    df = pd.DataFrame({"type" : df["type"].astype("category"), "value" : df["value"].astype("category"),
+        "start" : Start, "end" : End - End_Offset + Offset})
+    # Records with a missing or malformed date are dropped, as the records table drops them
+    return df[Start_Valid & End_Valid].reset_index(drop=True)
+
+
+def build_categories(df):
+    """
+    Interval table of category_frame's rows with dictionary coded type and value, sorted by type then start.
+    The schema metadata holds each type's row range and longest interval, which is all an overlap query needs
+    to binary search the starts.
+    """
+    df = df.astype({"type" : object, "value" : object}).sort_values(["type", "start"], kind="mergesort").reset_index(drop=True)
+
+    Index = {}
+    for Type, Rows in df.groupby("type", sort=False).indices.items():
+        Index[Type] = [int(Rows[0]), int(Rows[-1]) + 1, int((df["end"].values[Rows] - df["start"].values[Rows]).max())]
+    Table = pa.table({
+        "type" : pa.array(df["type"].values, pa.string(), from_pandas=True).dictionary_encode(),
+        "value" : pa.array(df["value"].values, pa.string(), from_pandas=True).dictionary_encode(),
+        "start" : pa.array(df["start"].values, pa.int64()),
+        "end" : pa.array(df["end"].values, pa.int64())})
+    return Table.replace_schema_metadata({"index" : json.dumps(Index)})
+
+
+def write_categories(Table, path=CATEGORY_FILE):
+    feather.write_feather(Table, path)
+
+
+def overlapping(Type, start, end, path=CATEGORY_FILE):
+    """
+    Intervals of one type overlapping [start, end) (naive local timestamps), as a frame of value, start and end.
+    Only the rows that start within the longest interval before `start` are looked at. None without the table.
+    """
+    if not os.path.exists(path):
+        return None
+    Table = feather.read_table(path, memory_map=True)
+    Index = json.loads(Table.schema.metadata[b"index"])
+    if Type not in Index:
+        return pd.DataFrame({"value" : pd.Series(dtype=object), "start" : pd.Series(dtype=np.int64), "end" : pd.Series(dtype=np.int64)})
+    First_Row, Last_Row, Longest = Index[Type]
+    First = pd.Timestamp(start).value // 10**9
+    Last = pd.Timestamp(end).value // 10**9
+
+    Starts = Table["start"].slice(First_Row, Last_Row - First_Row).to_numpy()
+    Low = First_Row + np.searchsorted(Starts, First - Longest, side="left")
+    High = First_Row + np.searchsorted(Starts, Last, side="left")
+    Rows = Table.slice(Low, High - Low).select(["value", "start", "end"]).to_pandas()
+    Rows["value"] = Rows["value"].astype(str)
+    return Rows[Rows["end"] > First].reset_index(drop=True)
+
+
+def daily_minutes(Type, start_date, end_date, path=CATEGORY_FILE):
+    """
+    Minutes per local day and category value after start_date up to and including end_date,
+    with intervals split at midnight. None without the table.
+    """
+    First = pd.Timestamp(start_date) + pd.Timedelta(days=1)
+    Last = pd.Timestamp(end_date) + pd.Timedelta(days=1)
+    Rows = overlapping(Type, First, Last, path)
+    if Rows is None:
+        return None
+    row, Days, fraction = split_intervals(Rows["start"].values, Rows["end"].values, DAY)
+    Minutes = pd.DataFrame({"startDate" : Days.astype("datetime64[D]"), "value" : Rows["value"].values[row],
+        "minutes" : (Rows["end"] - Rows["start"]).values[row] * fraction / 60})
+    Minutes = Minutes[(Minutes["startDate"] >= First) & (Minutes["startDate"] < Last)]
+    return Minutes.pivot_table(index="startDate", columns="value", values="minutes", aggfunc="sum", fill_value=0)
@@ -0,0 +1,107 @@
+import os
+import time
+import tempfile
+import pyarrow as pa
+import pyarrow.compute as pc
+from src.storage import read_records
+from src import manifest
+
+SHM_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+SHM_PREFIX = "apple-watch-data"
+POINTER_FILE = os.path.join(SHM_DIR, f"{SHM_PREFIX}.current")
+MAP_ATTEMPTS = 5
+
+# Per-process view of the published dataset, remapped whenever the manifest names another version
+_Active = {"version" : None, "table" : None}
+
+
+def shm_path(version):
+    return os.path.join(SHM_DIR, f"{SHM_PREFIX}-{version}.arrow")
+
+
+def published_at(name):
+    # Versions start with the time_ns they were made at
+    return int(name[len(SHM_PREFIX) + 1:].split("-")[0])
+
+
+def publish(data, version=None):
+    """
+    Writes the dataset once as an uncompressed Arrow file in shared memory so every worker can map it read-only.
+    version is the manifest's "Dataset Version" the records belong to. The pointer file is swapped with os.replace,
+    so readers only ever see a complete version.
+    """
+    version = version or f"{time.time_ns()}-{os.getpid()}"
+    path = shm_path(version)
+    if not os.path.exists(path):
+        table = data if isinstance(data, pa.Table) else pa.Table.from_pandas(data, preserve_index=False)
+        with pa.OSFile(f"{path}.{os.getpid()}.tmp", "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(f"{path}.{os.getpid()}.tmp", path)
+
+    with open(f"{POINTER_FILE}.{os.getpid()}", "w") as f:
+        f.write(version)
+    os.replace(f"{POINTER_FILE}.{os.getpid()}", POINTER_FILE)
+
+    # Only older published versions go, another publisher's temporary or newer file is left alone.
+    # Workers still mapping an old version keep their pages until they remap.
+    for name in os.listdir(SHM_DIR):
+        if name.startswith(f"{SHM_PREFIX}-") and name.endswith(".arrow") and published_at(name) < published_at(os.path.basename(path)):
+            try:
+                os.remove(os.path.join(SHM_DIR, name))
+            except OSError:
+                pass
+    return version
+
+
+def current_version():
+    try:
+        with open(POINTER_FILE) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def table():
+    """
+    The records of the manifest's dataset version, mapped from shared memory. The pointer is shared by the whole host,
+    so when it names another version (an older run, another checkout) or its file is gone, the manifest's records file
+    is published again.
+    None until something has been ingested.
+    """
+    Manifest = manifest.Read_JSON()
+    if Manifest is None:
+        return None
+    Expected = Manifest["Dataset Version"]
+    if _Active["version"] == Expected:
+        return _Active["table"]
+
+    for _ in range(MAP_ATTEMPTS):
+        version = current_version()
+        if version != Expected or not os.path.exists(shm_path(version)):
+            version = publish(read_records(Manifest["Records File"]), Expected)
+        try:
+            source = pa.memory_map(shm_path(version), "r")
+        except FileNotFoundError:
+            # Superseded between reading the pointer and mapping it, follow the pointer again
+            continue
+        _Active["table"] = pa.ipc.open_file(source).read_all()
+        _Active["version"] = version
+        return _Active["table"]
+    raise FileNotFoundError(f"Dataset version {Expected} kept disappearing from {SHM_DIR}")
+
+
+def records(Type):
+    Table = table()
+    if Table is None:
+        raise FileNotFoundError("No Apple Health data has been ingested yet")
+    return Table.filter(pc.equal(Table["type"], Type)).to_pandas()
+
+
+def has_type(Type):
+    # Counted on the type column alone, nothing is converted to pandas
+    Table = table()
+    if Table is None:
+        raise FileNotFoundError("No Apple Health data has been ingested yet")
+    Types = Table.select(["type"])
+    return Types.filter(pc.equal(Types["type"], Type)).num_rows > 0
@@ -0,0 +1,114 @@
+import io
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as csv
+import pyarrow.parquet as pq
+from src.rollups import local_days
+from src.timestamps import iso_offset
+from src import query
+
+EXPORT_COLUMNS = ["type", "sourceName", "startDate", "endDate", "utcOffset", "value", "unit"]
+DATE_COLUMNS = ["startDate", "endDate"]
+# Media type and file extension per export format
+EXPORT_FORMATS = {
+    "arrow" : ("application/vnd.apache.arrow.stream", ".arrow"),
+    "parquet" : ("application/vnd.apache.parquet", ".parquet"),
+    "csv" : ("text/csv", ".csv")}
+BATCH_ROWS = 64 * 1024
+
+
+def export_schema(schema):
+    # Dictionary columns (partition keys, categoricals) are written as plain strings so every format can take them
+    return pa.schema([pa.field(name, pa.string()) if pa.types.is_dictionary(schema.field(name).type) else schema.field(name)
+        for name in EXPORT_COLUMNS])
+
+
+def table_batches(Table, types, first_day, last_day, batch_rows=BATCH_ROWS):
+    """
+    Rows of the shared in-memory table matching the types with a local day in [first_day, last_day],
+    filtered one slice at a time so only batch_rows rows are ever copied.
+    """
+    Schema = export_schema(Table.schema)
+    def batches():
+        for batch in Table.select(EXPORT_COLUMNS).to_batches(max_chunksize=batch_rows):
+            Days = local_days(batch.column(EXPORT_COLUMNS.index("startDate")).to_pandas())
+            Keep = pc.and_(pc.is_in(batch.column(0), value_set=pa.array(types)), pa.array((Days >= first_day) & (Days <= last_day)))
+            batch = batch.filter(Keep)
+            if batch.num_rows:
+                yield batch
+    return Schema, batches()
+
+
+def dataset_batches(types, first_day, last_day, batch_rows=BATCH_ROWS):
+    # Same rows off the partitioned Parquet dataset, one type after another
+    Schema = export_schema(query.records_dataset().schema)
+    def batches():
+        for Type in types:
+            if query.has_type(Type):
+                yield from query.scan(Type, first_day, last_day, EXPORT_COLUMNS, batch_size=batch_rows)
+    return Schema, batches()
+
+
+def iso_dates(Table):
+    """
+    startDate and endDate, naive wall time beside utcOffset, as local ISO 8601 strings carrying that offset,
+    "2020-03-01T10:00:00-05:00".
+    """
+    Offsets, Index = np.unique(Table.column("utcOffset").to_numpy(), return_inverse=True)
+    Suffix = pa.array(np.array([iso_offset(minutes) for minutes in Offsets], dtype=object)[Index], pa.string())
+    for name in DATE_COLUMNS:
+        Column = Table.column(name)
+        Seconds = Column.cast(pa.int64()).to_numpy() // {"s" : 1, "ms" : 10**3, "us" : 10**6, "ns" : 10**9}[Column.type.unit]
+        Wall = pc.strftime(pa.array(Seconds, pa.timestamp("s")), format="%Y-%m-%dT%H:%M:%S")
+        Table = Table.set_column(Table.schema.get_field_index(name), name, pc.binary_join_element_wise(Wall, Suffix, ""))
+    return Table
+
+
+class Chunks(io.RawIOBase):
+    # Write-only sink whose bytes are handed out as they are written
+    def __init__(self):
+        self.parts = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        return len(data)
+
+    def take(self):
+        data = b"".join(self.parts)
+        self.parts = []
+        return data
+
+
+def stream(Schema, batches, fmt):
+    """
+    Encodes record batches in fmt ("arrow", "parquet" or "csv") and yields the bytes batch by batch,
+    so memory stays bounded by one batch whatever the size of the export.
+    """
+    sink = Chunks()
+    if fmt == "arrow":
+        writer = pa.ipc.new_stream(sink, Schema)
+    elif fmt == "parquet":
+        writer = pq.ParquetWriter(sink, Schema, compression="zstd")
+    elif fmt == "csv":
+        # Dates go out as text with their own offset, a naive wall time alone is ambiguous when offsets differ
+        Schema = pa.schema([pa.field(Field.name, pa.string()) if Field.name in DATE_COLUMNS else Field for Field in Schema])
+        writer = csv.CSVWriter(sink, Schema)
+    else:
+        raise ValueError(f"Unknown export format {fmt}, expected one of {list(EXPORT_FORMATS)}")
+
+    for batch in batches:
+        batch = pa.Table.from_batches([batch])
+        batch = (iso_dates(batch) if fmt == "csv" else batch).cast(Schema)
+        if fmt == "parquet":
+            writer.write_table(batch, row_group_size=batch.num_rows)
+        else:
+            writer.write_table(batch)
+        data = sink.take()
+        if data:
+            yield data
+    writer.close()
+    yield sink.take()
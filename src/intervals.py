@@ -0,0 +1,59 @@
+import datetime
+import numpy as np
+import pandas as pd
+from src.options import Order
+from src.pyramid import local_seconds
+from src.timestamps import DAY_NAMES, EPOCH_WEEKDAY, civil_from_days, month_labels
+
+HOUR = 3600
+DAY = 86400
+
+
+def split_intervals(starts, ends, width=DAY):
+    """
+    Cuts [start, end) intervals (int64 seconds) at every multiple of width.
+    Returns (row, bucket, fraction): one entry per piece, with the source row, the bucket number (start // width)
+    and the share of the interval inside it. Zero length intervals keep their whole value in their start bucket.
+    """
+    starts = np.asarray(starts, dtype=np.int64)
+    ends = np.maximum(np.asarray(ends, dtype=np.int64), starts)
+    First = starts // width
+    Last = np.maximum(ends - 1, starts) // width
+    Pieces = Last - First + 1
+
+    row = np.repeat(np.arange(len(starts)), Pieces)
+    # Position of each piece inside its interval: a running count that restarts at every row
+    Offset = np.arange(len(row)) - np.repeat(np.cumsum(Pieces) - Pieces, Pieces)
+    bucket = First[row] + Offset
+
+    Duration = (ends - starts)[row]
+    Overlap = np.minimum(ends[row], (bucket + 1) * width) - np.maximum(starts[row], bucket * width)
+    fraction = np.where(Duration > 0, Overlap / np.maximum(Duration, 1), 1.0)
+    return row, bucket, fraction
+
+
+def apportion(df, width=DAY):
+    """
+    Sums each type's values per bucket of local wall time, splitting every record across the buckets
+    its startDate/endDate interval overlaps in proportion to the overlap.
+    Returns a frame of type, bucket (start // width) and value.
+    """
+    if df.empty:
+        return pd.DataFrame({"type" : pd.Series(dtype=object), "bucket" : pd.Series(dtype=np.int64), "value" : pd.Series(dtype=float)})
+    row, bucket, fraction = split_intervals(local_seconds(df["startDate"]), local_seconds(df["endDate"]), width)
+    Pieces = pd.DataFrame({"type" : df["type"].values[row], "bucket" : bucket, "value" : df["value"].values[row] * fraction})
+    return Pieces.groupby(["type", "bucket"], sort=True, observed=True)["value"].sum().reset_index()
+
+
+def calendar_totals(Totals, first_day, last_day):
+    """
+    Per day/month/weekday totals from apportion's daily buckets of one type, keeping days first_day through last_day.
+    Returns (By_Day, By_Month, By_DayofWeek) shaped like the graphs' groupbys.
+    """
+    Totals = Totals[(Totals["bucket"] >= first_day) & (Totals["bucket"] <= last_day)]
+    Days, Values = Totals["bucket"].values.astype(np.int64), Totals["value"].values
+    Year, Month, _ = civil_from_days(Days)
+    By_Day = pd.DataFrame({"startDate" : [datetime.date(1970, 1, 1) + datetime.timedelta(days=int(day)) for day in Days], "value" : Values})
+    By_Month = pd.Series(Values, index=month_labels(Year, Month), dtype=float).groupby(level=0).sum().rename_axis("month").reset_index(name = "value")
+    By_DayofWeek = pd.Series(Values, index=DAY_NAMES[(Days + EPOCH_WEEKDAY) % 7], dtype=float).groupby(level=0).sum()
+    return By_Day, By_Month, By_DayofWeek.rename("value").rename_axis("DayofWeek").reindex(Order)
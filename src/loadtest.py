@@ -0,0 +1,238 @@
+"""
+Concurrent session load test against the dashboard, in-process or under gunicorn.
+    python -m src.loadtest export.zip --sessions 8 --steps 10
+    python -m src.loadtest export.zip --sessions 8 --server gunicorn --workers 4
+
+Each session uploads the export, then moves the DatePicker and the Data-Dropdown the way a user would,
+calling _dash-update-component for every server callback those changes fire.
+Run it from the repo root, uploads overwrite Data/ like a real upload does.
+"""
+import os
+import sys
+import json
+import time
+import base64
+import random
+import socket
+import logging
+import argparse
+import threading
+import subprocess
+import urllib.request
+import urllib.error
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+
+RSS_INTERVAL = 0.2
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for(url, timeout=60):
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        try:
+            urllib.request.urlopen(url, timeout=5).read()
+            return
+        except (urllib.error.URLError, ConnectionError):
+            time.sleep(0.2)
+    raise TimeoutError(f"{url} did not come up within {timeout}s")
+
+
+def start_inprocess(port):
+    # Threaded werkzeug server on the app create_app() builds, so sessions contend like they would in one worker.
+    # Its RSS includes the simulated sessions, which share the process.
+    from werkzeug.serving import make_server
+    import main
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    server = make_server("127.0.0.1", port, main.create_app().server, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server.shutdown, lambda: [os.getpid()]
+
+
+def start_gunicorn(port, workers):
+    process = subprocess.Popen([sys.executable, "-m", "gunicorn", "--preload", "-w", str(workers), "--timeout", "300",
+        "-b", f"127.0.0.1:{port}", "main:create_server()"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    def stop():
+        process.terminate()
+        process.wait()
+    return stop, lambda: [process.pid] + child_pids(process.pid)
+
+
+def child_pids(pid):
+    Children = []
+    for name in os.listdir("/proc"):
+        if name.isdigit():
+            try:
+                with open(f"/proc/{name}/stat") as f:
+                    if int(f.read().rsplit(")", 1)[1].split()[1]) == pid:
+                        Children.append(int(name))
+            except (OSError, IndexError, ValueError):
+                pass
+    return Children
+
+
+def rss_mb(pid):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def sample_rss(pids, Peaks, stop):
+    # Highest resident set size seen per process while the sessions run
+    while not stop.is_set():
+        for pid in pids():
+            rss = rss_mb(pid)
+            if rss is not None:
+                Peaks[pid] = max(Peaks.get(pid, 0), rss)
+        stop.wait(RSS_INTERVAL)
+
+
+class Session:
+    """
+    One browser tab: posts callback requests built from the app's own _dash-dependencies
+    and records the latency and outcome of each one.
+    """
+    def __init__(self, base, dependencies, Results, seed):
+        self.base = base
+        self.dependencies = [Dependency for Dependency in dependencies if not Dependency.get("clientside_function")]
+        self.Results = Results
+        self.rng = random.Random(seed)
+        self.props = {}
+        self.first, self.last, self.types = None, None, []
+
+    def fire(self, Dependency, label):
+        Output_Spec = Dependency["output"]
+        Outputs = [dict(zip(["id", "property"], Part.rsplit(".", 1))) for Part in Output_Spec.strip(".").split("...")]
+        value = lambda Prop: {**Prop, "value" : self.props.get((Prop["id"], Prop["property"]))}
+        Payload = {
+            "output" : Output_Spec,
+            "outputs" : Outputs if Output_Spec.startswith("..") else Outputs[0],
+            "inputs" : [value(Prop) for Prop in Dependency["inputs"]],
+            "state" : [value(Prop) for Prop in Dependency["state"]],
+            "changedPropIds" : [f"{Prop['id']}.{Prop['property']}" for Prop in Dependency["inputs"]]}
+        Request = urllib.request.Request(f"{self.base}/_dash-update-component", data=json.dumps(Payload).encode(),
+            headers={"Content-Type" : "application/json"})
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(Request, timeout=300) as response:
+                Body = response.read()
+                status = response.status
+        except urllib.error.HTTPError as e:
+            Body, status = b"", e.code
+        except (urllib.error.URLError, ConnectionError, TimeoutError) as e:
+            Body, status = b"", type(e).__name__
+        self.Results.append({"callback" : label, "status" : status, "seconds" : time.perf_counter() - start,
+            "ok" : status in (200, 204)})
+        # 204 is PreventUpdate, a normal answer for lazy graphs
+        return json.loads(Body).get("response", {}) if status == 200 and Body else {}
+
+    def changed(self, *props):
+        # Every server callback listening to one of the changed properties, as the renderer would fire them
+        for Dependency in self.dependencies:
+            if any((Prop["id"], Prop["property"]) in props for Prop in Dependency["inputs"]):
+                self.fire(Dependency, Dependency["output"].strip(".").split(".")[0])
+
+    def upload(self, contents, filename):
+        self.props.update({("Upload-Button", "n_clicks") : 1, ("Upload-Component", "contents") : contents,
+            ("Upload-Component", "filename") : filename})
+        for Dependency in self.dependencies:
+            if {"id" : "Upload-Component", "property" : "contents"} in Dependency["inputs"]:
+                Response = self.fire(Dependency, "upload")
+                Picker = Response.get("DatePicker", {})
+                self.first = Picker.get("min_date_allowed")
+                self.last = Picker.get("max_date_allowed")
+                self.types = [Option["value"] for Option in Response.get("Data-Dropdown", {}).get("options", [])]
+        for Graph in [Dependency["output"].split(".")[0] for Dependency in self.dependencies]:
+            self.props[(f"{Graph}-Visible", "data")] = True
+
+    def pick_dates(self):
+        First, Last = pd.Timestamp(self.first), pd.Timestamp(self.last)
+        Span = self.rng.choice([None, 30, 90, 365, "random"])
+        if Span == "random":
+            Start = First + pd.Timedelta(days=self.rng.randint(0, max((Last - First).days - 7, 0)))
+            End = min(Last, Start + pd.Timedelta(days=self.rng.randint(7, 120)))
+        else:
+            Start, End = (First if Span is None else max(First, Last - pd.Timedelta(days=Span))), Last
+        self.props[("DatePicker", "start_date")] = Start.strftime("%Y-%m-%d")
+        self.props[("DatePicker", "end_date")] = End.strftime("%Y-%m-%d")
+        self.changed(("DatePicker", "start_date"), ("DatePicker", "end_date"))
+
+    def pick_metric(self):
+        self.props[("Data-Dropdown", "value")] = self.rng.choice(self.types)
+        self.changed(("Data-Dropdown", "value"))
+
+    def run(self, contents, filename, steps):
+        self.upload(contents, filename)
+        if self.first is None:
+            return
+        self.props[("DatePicker", "start_date")], self.props[("DatePicker", "end_date")] = self.first, self.last
+        self.changed(("DatePicker", "start_date"), ("DatePicker", "end_date"))
+        for _ in range(steps):
+            self.pick_dates() if self.rng.random() < 0.7 or not self.types else self.pick_metric()
+            time.sleep(self.rng.uniform(0, 0.2)) #Think time
+
+
+def load_test(zip_path, sessions=4, steps=10, server="inprocess", workers=2, seed=0):
+    """
+    Runs `sessions` concurrent sessions and returns (per callback latency table, summary dict, peak RSS per pid).
+    """
+    port = free_port()
+    stop_server, pids = start_inprocess(port) if server == "inprocess" else start_gunicorn(port, workers)
+    base = f"http://127.0.0.1:{port}"
+    Peaks = {}
+    Stop_Sampling = threading.Event()
+    try:
+        wait_for(f"{base}/_dash-layout")
+        Sampler = threading.Thread(target=sample_rss, args=(pids, Peaks, Stop_Sampling), daemon=True)
+        Sampler.start()
+        dependencies = json.loads(urllib.request.urlopen(f"{base}/_dash-dependencies").read())
+        with open(zip_path, "rb") as f:
+            contents = "data:application/zip;base64," + base64.b64encode(f.read()).decode()
+
+        Results = []
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=sessions) as pool:
+            Futures = [pool.submit(Session(base, dependencies, Results, seed + i).run, contents, os.path.basename(zip_path), steps)
+                for i in range(sessions)]
+            for future in Futures:
+                future.result()
+        Wall = time.perf_counter() - start
+    finally:
+        Stop_Sampling.set()
+        stop_server()
+
+    Calls = pd.DataFrame(Results)
+    Seconds = Calls["seconds"] * 1000
+    Table = Calls.assign(ms=Seconds).groupby("callback").agg(calls=("ms", "size"), errors=("ok", lambda ok: int((~ok).sum())),
+        p50=("ms", "median"), p95=("ms", lambda ms: np.percentile(ms, 95)), p99=("ms", lambda ms: np.percentile(ms, 99)), max=("ms", "max"))
+    Summary = {"sessions" : sessions, "requests" : len(Calls), "wall s" : Wall, "requests/s" : len(Calls) / Wall,
+        "error rate" : float((~Calls["ok"]).mean()), "p50 ms" : float(np.percentile(Seconds, 50)),
+        "p95 ms" : float(np.percentile(Seconds, 95)), "p99 ms" : float(np.percentile(Seconds, 99))}
+    return Table, Summary, Peaks
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Concurrent dashboard session load test")
+    parser.add_argument("zip", help = "Apple Health export uploaded by every session")
+    parser.add_argument("--sessions", type = int, default = 4)
+    parser.add_argument("--steps", type = int, default = 10, help = "DatePicker/Data-Dropdown changes per session after the upload")
+    parser.add_argument("--server", choices = ["inprocess", "gunicorn"], default = "inprocess")
+    parser.add_argument("--workers", type = int, default = 2, help = "gunicorn workers")
+    parser.add_argument("--seed", type = int, default = 0)
+    args = parser.parse_args()
+
+    Table, Summary, Peaks = load_test(args.zip, args.sessions, args.steps, args.server, args.workers, args.seed)
+    print(Table.round(1).to_string())
+    print(", ".join(f"{key} {value:.3f}" if isinstance(value, float) else f"{key} {value}" for key, value in Summary.items()))
+    print("Peak RSS per process: " + ", ".join(f"{pid} {rss:.0f} MB" for pid, rss in sorted(Peaks.items())))
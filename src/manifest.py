@@ -0,0 +1,105 @@
+import os
+import json
+import time
+import datetime
+import pyarrow.dataset as ds
+
+JSON_FILE = "Data/config.json"
+
+# Parsed manifest, reread only when the file changes
+_Loaded = {"mtime" : None, "manifest" : None}
+
+
+def summarize(df):
+    # Rows, local date bounds and per-type catalog of one records frame, Write_JSON combines them
+    Dates = df["startDate"].dt.tz_localize(None) if df["startDate"].dt.tz is not None else df["startDate"]
+    Grouped = df.groupby("type", observed=True)
+    Bounds = Grouped["startDate"].agg(["size", "min", "max"])
+    Units = Grouped["unit"].unique()
+    Sources = Grouped["sourceName"].unique()
+    Types = {Type : {"rows" : int(Row["size"]), "first" : Row["min"].isoformat(), "last" : Row["max"].isoformat(),
+        "units" : sorted(Units[Type].tolist()), "sources" : sorted(Sources[Type].tolist())} for Type, Row in Bounds.iterrows()}
+    return {"Rows" : len(df), "First" : Dates.min().date() if len(df) else None, "Last" : Dates.max().date() if len(df) else None, "Types" : Types}
+
+
+def merge_type(Entry, Other):
+    # One type's catalog entry over two chunks of its rows, ISO timestamps compare as strings
+    return {"rows" : Entry["rows"] + Other["rows"], "first" : min(Entry["first"], Other["first"]), "last" : max(Entry["last"], Other["last"]),
+        "units" : sorted(set(Entry["units"]) | set(Other["units"])), "sources" : sorted(set(Entry["sources"]) | set(Other["sources"]))}
+
+
+def Write_JSON(Summaries, Watch, records_file, path=JSON_FILE):
+    """
+    Catalog of one ingestion: date bounds, per-type row counts, first/last timestamps, units and sources,
+    plus a dataset version that changes with every upload. Written beside the records so readers never scan them.
+    Summaries come from summarize(), of the whole records frame or of chunks of it, one type at a time.
+    """
+    try:
+        Firsts = [Summary["First"] for Summary in Summaries if Summary["First"] is not None]
+        Lasts = [Summary["Last"] for Summary in Summaries if Summary["Last"] is not None]
+        Types = {}
+        for Summary in Summaries:
+            for Type, Entry in Summary["Types"].items():
+                Types[Type] = Entry if Type not in Types else merge_type(Types[Type], Entry)
+
+        Data = {
+            "Apple Watch Name" : Watch,
+            "Data Upload Date" : datetime.datetime.now().isoformat(timespec="seconds"),
+            "First Date Instance" : min(Firsts).isoformat() if Firsts else None,
+            "Last Date Instance" : max(Lasts).isoformat() if Lasts else None,
+            "Dataset Version" : f"{time.time_ns()}-{os.getpid()}",
+            "Records File" : records_file,
+            "Rows" : sum(Summary["Rows"] for Summary in Summaries),
+            "Types" : dict(sorted(Types.items()))}
+        obj = json.dumps(Data, indent = 4)
+        with open(f"{path}.tmp", "w") as f:
+            f.write(obj)
+        os.replace(f"{path}.tmp", path)
+        return Data
+    except Exception as e:
+        print(f"{e} error with json")
+
+
+def Read_JSON(path=JSON_FILE):
+    # None until something has been ingested
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    if mtime != _Loaded["mtime"]:
+        with open(path) as f:
+            _Loaded["manifest"] = json.load(f)
+        _Loaded["mtime"] = mtime
+    return _Loaded["manifest"]
+
+
+def version(path=JSON_FILE):
+    Manifest = Read_JSON(path)
+    return None if Manifest is None else Manifest["Dataset Version"]
+
+
+def date_bounds(path=JSON_FILE):
+    # (first, last) local dates of everything ingested, as datetime.date
+    Manifest = Read_JSON(path)
+    if Manifest is None or Manifest["First Date Instance"] is None:
+        return None
+    return (datetime.date.fromisoformat(Manifest["First Date Instance"]), datetime.date.fromisoformat(Manifest["Last Date Instance"]))
+
+
+def validate(records=None, path=JSON_FILE):
+    """
+    Manifest of the last ingestion if its records (the file it names, or a Parquet dataset directory)
+    still hold the row count it recorded, else None. Only file footers are read, never the rows.
+    """
+    Manifest = Read_JSON(path)
+    if Manifest is None:
+        return None
+    records = records or Manifest.get("Records File")
+    try:
+        Rows = ds.dataset(records, format="parquet" if os.path.isdir(records) or records.endswith(".parquet") else "feather").count_rows()
+    except FileNotFoundError:
+        return None
+    except (OSError, TypeError, ValueError) as e:
+        print(f"{e} error validating {records}")
+        return None
+    return Manifest if Rows == Manifest["Rows"] else None
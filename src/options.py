@@ -1,3 +1,4 @@
+Order = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
 
 def Get_Drop_Choices():
     Drop_Choices = [
@@ -71,3 +72,46 @@ Explination_Table = {
     
 }
 
+
+
+# How each graph aggregates its metric, shared by the server rollups and the clientside graphs
+Graph_Specs = {
+    "ActiveEnergyGraph" : 
+    {"type" : "HKQuantityTypeIdentifierActiveEnergyBurned", "fn" : "sum", "title" : "Active Energy Burned", "unit" : "Calories", "name" : "Calories"},
+
+    "BasalEnergyGraph" : 
+    {"type" : "HKQuantityTypeIdentifierBasalEnergyBurned", "fn" : "sum", "title" : "Basal Energy Burned", "unit" : "Calories", "name" : "Calories"},
+
+    "ExerciseTimeGraph" : 
+    {"type" : "HKQuantityTypeIdentifierAppleExerciseTime", "fn" : "sum", "title" : "Apple Excersise Minutes", "unit" : "Minutes", "name" : "Minutes"},
+
+    "StandTimeGraph" : 
+    {"type" : "HKQuantityTypeIdentifierAppleStandTime", "fn" : "sum", "title" : "Stand Time", "unit" : "Minutes", "name" : "Minutes"},
+
+    "StepCountGraph" : 
+    {"type" : "HKQuantityTypeIdentifierStepCount", "fn" : "sum", "title" : "Step Count", "unit" : "Steps", "name" : "Steps"},
+
+    "FlightsClimbedGraph" : 
+    {"type" : "HKQuantityTypeIdentifierFlightsClimbed", "fn" : "sum", "title" : "Flights Climbed", "unit" : "Flights", "name" : "Flights"},
+
+    "DistanceWalkingRunningGraph" : 
+    {"type" : "HKQuantityTypeIdentifierDistanceWalkingRunning", "fn" : "sum", "title" : "Distance Moved", "unit" : "Miles", "name" : "Miles"},
+
+    "EnvironmentalAudioExposureGraph" : 
+    {"type" : "HKQuantityTypeIdentifierEnvironmentalAudioExposure", "fn" : "mean", "title" : "Decible Exposure", "unit" : "Decibles", "name" : "Decibles"},
+
+    "HeartRateGraph" : 
+    {"type" : "HKQuantityTypeIdentifierHeartRate", "fn" : "range", "title" : "Highest and Lowest Heart Rate", "unit" : "Count/Min", "name" : "CPM"},
+
+    "WalkingHeartRateAverageGraph" : 
+    {"type" : "HKQuantityTypeIdentifierWalkingHeartRateAverage", "fn" : "daily", "title" : "Walking Heart Rate Average", "unit" : "Count/Min", "name" : "CPM"},
+
+    "RestingHeartRateAverageGraph" : 
+    {"type" : "HKQuantityTypeIdentifierRestingHeartRate", "fn" : "daily", "title" : "Resting Heart Rate", "unit" : "Count/Min", "name" : "Count/Min"},
+
+    "HeartRateVariabilityGraph" : 
+    {"type" : "HKQuantityTypeIdentifierHeartRateVariabilitySDNN", "fn" : "daily", "title" : "Heart Rate Variability", "unit" : "ms", "name" : "Miliseconds"},
+
+    "HeartRateZoneGraph" : 
+    {"type" : "HKQuantityTypeIdentifierHeartRate", "fn" : "zones", "title" : "Minutes in Heart Rate Zone", "unit" : "Minutes", "name" : "Minutes", "rollup" : "zones"},
+}
@@ -0,0 +1,115 @@
+import os
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from pyarrow import feather
+from src.options import Graph_Specs
+from src.pyramid import local_seconds
+from src.intervals import split_intervals, DAY
+
+PREFIX_FILE = "Data/prefix.feather"
+# Metrics that are totalled per day, the only ones a running sum makes sense for
+PREFIX_TYPES = list(dict.fromkeys(Spec["type"] for Spec in Graph_Specs.values() if Spec["fn"] == "sum"))
+Epoch = pd.Timestamp("1970-01-01")
+
+
+def daily_totals(df, types=PREFIX_TYPES):
+    """
+    {type : (first local day, total of every day from there to the last)} with days without samples included.
+    Records spanning midnight are split across the days they overlap.
+    """
+    Totals = {}
+    for Type in types:
+        Samples = df[df["type"] == Type]
+        if Samples.empty:
+            continue
+        row, Days, fraction = split_intervals(local_seconds(Samples["startDate"]), local_seconds(Samples["endDate"]), DAY)
+        First = Days.min()
+        Totals[Type] = (int(First), np.bincount(Days - First, weights=Samples["value"].values[row] * fraction))
+    return Totals
+
+
+def add_totals(Totals, More):
+    # Daily totals of more rows added to Totals, the days of both lined up
+    for Type, (First, Days) in More.items():
+        if Type not in Totals:
+            Totals[Type] = (First, Days)
+            continue
+        Start, Previous = Totals[Type]
+        Begin = min(Start, First)
+        Sum = np.zeros(max(Start + len(Previous), First + len(Days)) - Begin)
+        Sum[Start - Begin:Start - Begin + len(Previous)] += Previous
+        Sum[First - Begin:First - Begin + len(Days)] += Days
+        Totals[Type] = (Begin, Sum)
+    return Totals
+
+
+def prefix_table(Totals, types=PREFIX_TYPES):
+    # One row per type: the first local day and the running total through every day from there on
+    Types = [Type for Type in types if Type in Totals]
+    return pa.table({
+        "type" : pa.array(Types, pa.string()),
+        "first_day" : pa.array([Totals[Type][0] for Type in Types], pa.int32()),
+        "cumulative" : pa.array([np.cumsum(Totals[Type][1]) for Type in Types], pa.list_(pa.float64()))})
+
+
+def build_prefix(df, types=PREFIX_TYPES):
+    """
+    One row per type: the first local day and the running total through every day from there on,
+    days without samples included, so a range total is two lookups.
+    """
+    return prefix_table(daily_totals(df, types), types)
+
+
+def write_prefix(Table, path=PREFIX_FILE):
+    feather.write_feather(Table, path)
+
+
+def read_prefix(Type, path=PREFIX_FILE):
+    # (first day, running totals) or None without a prefix for Type
+    if not os.path.exists(path):
+        return None
+    Table = feather.read_table(path)
+    Rows = Table["type"].to_pylist()
+    if Type not in Rows:
+        return None
+    Row = Rows.index(Type)
+    return Table["first_day"][Row].as_py(), Table["cumulative"][Row].values.to_numpy()
+
+
+def through(Prefix, days):
+    # Running total through each day (an array of day ordinals), 0 before the first day and flat after the last
+    First, Cumulative = Prefix
+    Index = np.clip(np.asarray(days) - First, -1, len(Cumulative) - 1)
+    return np.where(Index < 0, 0.0, Cumulative[np.maximum(Index, 0)])
+
+
+def day_number(date):
+    return (pd.Timestamp(date) - Epoch).days
+
+
+def range_total(Type, start_date, end_date, path=PREFIX_FILE):
+    """
+    Total after start_date up to and including end_date, and the average per day over the same range.
+    None without a prefix for Type.
+    """
+    Prefix = read_prefix(Type, path)
+    if Prefix is None:
+        return None
+    Start, End = day_number(start_date), day_number(end_date)
+    Total = float(through(Prefix, [End])[0] - through(Prefix, [Start])[0])
+    return Total, Total / max(End - Start, 1)
+
+
+def rolling_average(Type, start_date, end_date, window, path=PREFIX_FILE):
+    """
+    Trailing `window` day average for every day after start_date up to and including end_date, as a Series by date.
+    Days whose window reaches back before the first ingested day are NaN. None without a prefix for Type.
+    """
+    Prefix = read_prefix(Type, path)
+    if Prefix is None:
+        return None
+    Days = np.arange(day_number(start_date) + 1, day_number(end_date) + 1)
+    Average = (through(Prefix, Days) - through(Prefix, Days - window)) / window
+    Average[Days - window + 1 < Prefix[0]] = np.nan
+    return pd.Series(Average, index=(Epoch + pd.to_timedelta(Days, unit="D")).date)
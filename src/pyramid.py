@@ -0,0 +1,131 @@
+import os
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+PYRAMID_FILE = "Data/pyramid.parquet"
+PYRAMID_TYPES = ["HKQuantityTypeIdentifierHeartRate", "HKQuantityTypeIdentifierEnvironmentalAudioExposure"]
+# Bucket widths in seconds of local wall time, finest first. Weeks start on Monday (1970-01-01 was a Thursday).
+LEVELS = {"minute" : 60, "hour" : 3600, "day" : 86400, "week" : 7 * 86400}
+WEEK_SHIFT = 3 * 86400
+MAX_POINTS = 1500
+PYRAMID_COLUMNS = ["type", "level", "time", "min", "max", "mean", "count"]
+
+
+def local_seconds(dates):
+    if dates.dt.tz is not None:
+        dates = dates.dt.tz_localize(None)
+    return dates.values.astype("datetime64[s]").astype(np.int64)
+
+
+def bucket_starts(seconds, level):
+    Width = LEVELS[level]
+    Shift = WEEK_SHIFT if level == "week" else 0
+    return (seconds + Shift) // Width * Width - Shift
+
+
+def pyramid_buckets(df, types=PYRAMID_TYPES):
+    """
+    min/max/sum/count per minute, hour, day and week for the high frequency types.
+    Minutes come from the raw samples, every coarser level is folded from the one below it.
+    """
+    Levels = []
+    for Type in types:
+        Samples = df[df["type"] == Type]
+        if Samples.empty:
+            continue
+        Level = pd.DataFrame({"time" : bucket_starts(local_seconds(Samples["startDate"]), "minute"), "value" : Samples["value"].values})
+        Level = Level.groupby("time")["value"].agg(["min", "max", "sum", "count"]).reset_index()
+        for name in LEVELS:
+            if name != "minute":
+                Level["time"] = bucket_starts(Level["time"].values, name)
+                Level = fold_buckets(Level, ["time"])
+            Levels.append(Level.assign(type=Type, level=name))
+    if not Levels:
+        return pd.DataFrame(columns=["type", "level", "time", "min", "max", "sum", "count"])
+    return pd.concat(Levels, ignore_index=True)
+
+
+def fold_buckets(Buckets, keys):
+    return Buckets.groupby(keys, sort=True).agg({"min" : "min", "max" : "max", "sum" : "sum", "count" : "sum"}).reset_index()
+
+
+def finished(Buckets):
+    Pyramid = Buckets.assign(mean=Buckets["sum"] / Buckets["count"])
+    return Pyramid[PYRAMID_COLUMNS]
+
+
+def build_pyramid(df, types=PYRAMID_TYPES):
+    # min/max/mean/count per minute, hour, day and week of every high frequency type in df
+    Buckets = pyramid_buckets(df, types)
+    return finished(Buckets) if len(Buckets) else pd.DataFrame(columns=PYRAMID_COLUMNS)
+
+
+def carry_pyramids(frames, types=PYRAMID_TYPES):
+    """
+    Pyramids of consecutive chunks of start sorted records, in type order with one type's chunks after another.
+    A chunk's last bucket of each level of its last type may go on in the next chunk, so it is held back and folded into
+    that chunk's buckets (min, max, sum and count all combine) until a chunk without the type shows it is complete.
+    """
+    Held = pyramid_buckets(pd.DataFrame(columns=["type", "startDate", "value"]), types)
+    for frame in frames:
+        Buckets = pyramid_buckets(frame, types)
+        Continued = Held["type"].isin(Buckets["type"].unique())
+        if (~Continued).any():
+            yield finished(Held[~Continued])
+        if Buckets.empty:
+            Held = Held[Continued]
+            continue
+        if Continued.any():
+            Buckets = fold_buckets(pd.concat([Held[Continued], Buckets], ignore_index=True), ["type", "level", "time"])
+        # Only the last type can go on, chunks and the types in one chunk come in type order
+        Last = (Buckets["type"].values == Buckets["type"].max()) & (Buckets["time"].values == Buckets.groupby(["type", "level"])["time"].transform("max").values)
+        Held = Buckets[Last]
+        if (~Last).any():
+            yield finished(Buckets[~Last])
+    if len(Held):
+        yield finished(Held)
+
+
+def write_pyramid(Pyramids, path=PYRAMID_FILE):
+    """
+    Sorted so a window read only touches the row groups of one type and level.
+    Takes one pyramid, or pyramids in type order (several may cover one type) which are written as they arrive.
+    """
+    writer = None
+    for Pyramid in [Pyramids] if isinstance(Pyramids, pd.DataFrame) else Pyramids:
+        Table = pa.Table.from_pandas(Pyramid.sort_values(["type", "level", "time"], kind="mergesort"), preserve_index=False)
+        if writer is None:
+            writer = pq.ParquetWriter(path, Table.schema, compression="zstd")
+        writer.write_table(Table, row_group_size=16 * 1024)
+    if writer is None:
+        pq.write_table(pa.Table.from_pandas(pd.DataFrame(columns=PYRAMID_COLUMNS), preserve_index=False), path)
+    else:
+        writer.close()
+
+
+def choose_level(start, end, max_points=MAX_POINTS):
+    # Finest level that still draws at most max_points buckets over the window
+    Span = (pd.Timestamp(end) - pd.Timestamp(start)).total_seconds()
+    for name, Width in LEVELS.items():
+        if Span / Width <= max_points:
+            return name
+    return "week"
+
+
+def read_level(Type, level, start, end, path=PYRAMID_FILE):
+    """
+    Buckets of one level with start <= time < end (naive local timestamps), or None without a pyramid for Type.
+    """
+    if not os.path.exists(path):
+        return None
+    First = pd.Timestamp(start).value // 10**9
+    Last = pd.Timestamp(end).value // 10**9
+    Filter = ((pc.field("type") == Type) & (pc.field("level") == level) & (pc.field("time") >= First) & (pc.field("time") < Last))
+    Level = pq.read_table(path, columns=["time", "min", "max", "mean", "count"], filters=Filter).to_pandas()
+    if Level.empty and not pq.read_table(path, columns=["type"], filters=pc.field("type") == Type).num_rows:
+        return None
+    Level["time"] = pd.to_datetime(Level["time"], unit="s")
+    return Level
@@ -0,0 +1,89 @@
+import os
+import shutil
+import datetime
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from src.options import Order
+from src.rollups import local_days
+from src.intervals import apportion, calendar_totals
+from src.storage import SORT_KEYS
+
+DATASET_DIR = "Data/records"
+DATASET_COLUMNS = ["type", "year", "localDay", "month", "DayofWeek", "startDate", "endDate", "utcOffset", "value", "unit", "sourceName"]
+GROUP_KEYS = {"startDate" : "localDay", "month" : "month", "DayofWeek" : "DayofWeek"}
+Epoch = datetime.date(1970, 1, 1)
+
+
+def write_dataset(frames, path=DATASET_DIR):
+    """
+    Writes the records as Parquet partitioned by type and year, with a localDay column for date predicates.
+    Takes the records frame or an iterable of frames (such as one per type), each appended to the new dataset,
+    which is built beside the old one and swapped in once complete.
+    """
+    shutil.rmtree(f"{path}.tmp", ignore_errors=True)
+    for df in [frames] if isinstance(frames, pd.DataFrame) else frames:
+        df = df.assign(localDay=local_days(df["startDate"]).astype("int32"))[DATASET_COLUMNS]
+        table = pa.Table.from_pandas(df.sort_values(SORT_KEYS, kind="mergesort"), preserve_index=False)
+        pq.write_to_dataset(table, f"{path}.tmp", partition_cols=["type", "year"], compression="zstd", use_dictionary=True, write_statistics=True)
+    if os.path.exists(path):
+        os.rename(path, f"{path}.old")
+    os.rename(f"{path}.tmp", path)
+    shutil.rmtree(f"{path}.old", ignore_errors=True)
+
+
+def records_dataset(path=DATASET_DIR):
+    return ds.dataset(path, format="parquet", partitioning="hive")
+
+
+def has_type(Type, path=DATASET_DIR):
+    return os.path.isdir(os.path.join(path, f"type={Type}"))
+
+
+def scan(Type, first_day, last_day, columns, path=DATASET_DIR, batch_size=128 * 1024):
+    # Partition pruning on type/year, row group statistics on localDay, and only the needed columns are read
+    Days = ds.field("localDay")
+    Filter = ((ds.field("type") == Type) & (ds.field("year") >= (Epoch + datetime.timedelta(days=first_day)).year)
+        & (ds.field("year") <= (Epoch + datetime.timedelta(days=last_day)).year) & (Days >= first_day) & (Days <= last_day))
+    return records_dataset(path).to_batches(columns=columns, filter=Filter, batch_size=batch_size)
+
+
+def aggregate(Type, start_date, end_date, fn, path=DATASET_DIR):
+    """
+    Per day/month/weekday aggregates of one type, streamed batch by batch so memory only grows with the number of groups.
+    Same date window as the graphs: after start_date up to and including end_date.
+    Returns (By_Day, By_Month, By_DayofWeek) shaped like the in-memory pandas groupbys.
+    """
+    first_day = (pd.to_datetime(start_date).date() - Epoch).days + 1
+    last_day = (pd.to_datetime(end_date).date() - Epoch).days
+
+    if fn == "sum":
+        # Totals split records spanning midnight across both days, so the day before may add to the first one
+        Totals = None
+        for batch in scan(Type, first_day - 1, last_day, ["type", "startDate", "endDate", "value"], path):
+            Part = apportion(batch.to_pandas())
+            Totals = Part if Totals is None else pd.concat([Totals, Part]).groupby(["type", "bucket"], sort=True)["value"].sum().reset_index()
+        return calendar_totals(apportion(pd.DataFrame()) if Totals is None else Totals, first_day, last_day)
+
+    Partials = {key : None for key in GROUP_KEYS.values()}
+    for batch in scan(Type, first_day, last_day, ["value", *GROUP_KEYS.values()], path):
+        Batch = batch.to_pandas()
+        for key, Partial in Partials.items():
+            Part = Batch.groupby(key)["value"].agg(["sum", "count", "min", "max"])
+            if Partial is not None:
+                Part = pd.concat([Partial, Part]).groupby(level=0).agg({"sum" : "sum", "count" : "sum", "min" : "min", "max" : "max"})
+            Partials[key] = Part
+
+    Results = {}
+    for key, Partial in Partials.items():
+        if Partial is None:
+            Partial = pd.DataFrame(columns=["sum", "count", "min", "max"], dtype="float64")
+        Results[key] = Partial["sum"] / Partial["count"] if fn == "mean" else Partial[fn]
+
+    By_Day = Results["localDay"].sort_index()
+    By_Day.index = [Epoch + datetime.timedelta(days=int(day)) for day in By_Day.index]
+    By_Day = By_Day.rename_axis("startDate").reset_index(name = "value")
+    By_Month = Results["month"].sort_index().rename_axis("month").reset_index(name = "value")
+    By_DayofWeek = Results["DayofWeek"].rename_axis("DayofWeek").reindex(Order)
+    return By_Day, By_Month, By_DayofWeek
@@ -0,0 +1,81 @@
+import json
+import numpy as np
+import pandas as pd
+from src.options import Graph_Specs
+from src.intervals import apportion
+
+ROLLUPS_FILE = "Data/rollups.json"
+SUM_TYPES = [Spec["type"] for Spec in Graph_Specs.values() if Spec["fn"] == "sum"]
+
+
+def local_days(dates):
+    # Days since 1970-01-01 on the wall clock the sample was recorded in
+    if dates.dt.tz is not None:
+        dates = dates.dt.tz_localize(None)
+    return dates.values.astype("datetime64[D]").astype(np.int64)
+
+
+def rounded(value):
+    # Days with only a share of a record spanning midnight have no samples to take a min or max of
+    return None if value is None else round(float(value), 3)
+
+
+def daily_stats(df):
+    """
+    Unrounded per-day sum/count/min/max of every graphed type as a frame of type, day and the four stats.
+    Stats of chunks of one type combine with combine_stats.
+    """
+    Types = [Spec["type"] for Spec in Graph_Specs.values()]
+    df = df[df["type"].isin(Types)]
+    Frame = pd.DataFrame({"type" : df["type"].values, "day" : local_days(df["startDate"]), "value" : df["value"].values})
+    Grouped = Frame.groupby(["type", "day"])["value"].agg(["sum", "count", "min", "max"])
+    # Totalled metrics sum each day's share of every record, like the server's bars, counts stay per sample
+    Totals = apportion(df[df["type"].isin(SUM_TYPES)]).rename(columns={"bucket" : "day"}).set_index(["type", "day"])["value"]
+    Grouped = Grouped.join(Totals.rename("apportioned"), how="outer")
+    Grouped["sum"] = Grouped["apportioned"].where(Grouped.index.get_level_values("type").isin(SUM_TYPES), Grouped["sum"])
+    Grouped["count"] = Grouped["count"].fillna(0).astype(int)
+    return Grouped[["sum", "count", "min", "max"]].reset_index()
+
+
+def combine_stats(Stats):
+    # Chunks of one type share the days at their edges: sums and counts add up, min and max of the two
+    Stats = pd.concat(Stats, ignore_index=True)
+    return Stats.groupby(["type", "day"]).agg({"sum" : "sum", "count" : "sum", "min" : "min", "max" : "max"}).reset_index()
+
+
+def rollup_columns(Stats):
+    """
+    daily_stats laid out column-wise so it can be shipped to the browser once.
+    {type : {"day" : [days since epoch], "sum" : [...], "count" : [...], "min" : [...], "max" : [...]}}
+    """
+    Stats = Stats.astype(object).where(Stats.notna(), None)
+    Rollups = {}
+    for Type, Rows in Stats.groupby("type"):
+        Rollups[Type] = {
+            "day" : Rows["day"].tolist(),
+            "sum" : [rounded(value) for value in Rows["sum"]],
+            "count" : Rows["count"].tolist(),
+            "min" : [rounded(value) for value in Rows["min"]],
+            "max" : [rounded(value) for value in Rows["max"]]}
+    return Rollups
+
+
+def daily_rollups(df):
+    # Per-day sum/count/min/max for every graphed type, column-wise for the browser
+    return rollup_columns(daily_stats(df))
+
+
+def write_rollups(Rollups, version, path=ROLLUPS_FILE):
+    # Tagged with the dataset version they were built from, so a restart never ships another ingestion's rollups
+    with open(path, "w") as f:
+        json.dump({"version" : version, "rollups" : Rollups}, f)
+
+
+def read_rollups(version, path=ROLLUPS_FILE):
+    # The rollups built when this dataset version was ingested, None without them
+    try:
+        with open(path) as f:
+            Saved = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return Saved.get("rollups") if Saved.get("version") == version else None
@@ -0,0 +1,133 @@
+import os
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from pyarrow import feather
+from src.options import Order
+from src.rollups import local_days
+
+SKETCH_FILE = "Data/sketches.feather"
+# Fixed-width histogram per type per day: (low, high, bin width). Merging days is adding counts,
+# and any quantile read back is within one bin width of the exact value.
+SKETCH_BINS = {
+    "HKQuantityTypeIdentifierHeartRate" : (30.0, 230.0, 1.0),
+    "HKQuantityTypeIdentifierEnvironmentalAudioExposure" : (20.0, 130.0, 0.5)}
+PERCENTILES = [5, 50, 95]
+
+
+def bin_count(Type):
+    low, high, width = SKETCH_BINS[Type]
+    return int(round((high - low) / width))
+
+
+def build_sketches(df):
+    """
+    One histogram row per (type, local day), as an Arrow table of type, day and a list of bin counts.
+    """
+    Tables = []
+    for Type, (low, high, width) in SKETCH_BINS.items():
+        Samples = df[df["type"] == Type]
+        if Samples.empty:
+            continue
+        Bins = bin_count(Type)
+        Days, Day_Index = np.unique(local_days(Samples["startDate"]), return_inverse=True)
+        Bin = np.clip(((Samples["value"].values - low) / width).astype(np.int64), 0, Bins - 1)
+        Counts = np.bincount(Day_Index * Bins + Bin, minlength=len(Days) * Bins).astype(np.uint32)
+        Tables.append(sketch_table(Type, Days, Counts))
+    return pa.concat_tables(Tables) if Tables else None
+
+
+def sketch_table(Type, Days, Counts):
+    Bins = bin_count(Type)
+    return pa.table({
+        "type" : pa.array([Type] * len(Days), pa.string()),
+        "day" : pa.array(Days.astype(np.int32)),
+        "counts" : pa.ListArray.from_arrays(pa.array(np.arange(len(Days) + 1, dtype=np.int32) * Bins), pa.array(Counts.ravel().astype(np.uint32)))})
+
+
+def combine_sketches(Tables):
+    """
+    One table from the sketches of several chunks of records. Chunks of one type share the days at their edges,
+    whose counts are added, as histograms merge. None without any sketch.
+    """
+    Tables = [Table for Table in Tables if Table is not None]
+    if not Tables:
+        return None
+    Table = pa.concat_tables(Tables)
+    Combined = []
+    for Type in SKETCH_BINS:
+        Rows = Table.filter(pc.equal(Table["type"], Type))
+        if not Rows.num_rows:
+            continue
+        Counts = Rows["counts"].combine_chunks().flatten().to_numpy(zero_copy_only=False).reshape(-1, bin_count(Type))
+        Days, Day_Index = np.unique(Rows["day"].to_numpy(), return_inverse=True)
+        Summed = np.zeros((len(Days), Counts.shape[1]), dtype=np.uint32)
+        np.add.at(Summed, Day_Index, Counts)
+        Combined.append(sketch_table(Type, Days, Summed))
+    return pa.concat_tables(Combined)
+
+
+def write_sketches(Table, path=SKETCH_FILE):
+    # Without sketched samples the previous upload's sketches are removed, readers then find none
+    if Table is None:
+        if os.path.exists(path):
+            os.remove(path)
+        return
+    feather.write_feather(Table, path)
+
+
+def read_sketches(Type, first_day, last_day, path=SKETCH_FILE):
+    # (days, counts matrix) for first_day <= day <= last_day, or None without sketches for Type
+    if Type not in SKETCH_BINS or not os.path.exists(path):
+        return None
+    Table = feather.read_table(path)
+    Table = Table.filter(pc.equal(Table["type"], Type))
+    if not Table.num_rows:
+        return None
+    Table = Table.filter(pc.and_(pc.greater_equal(Table["day"], first_day), pc.less_equal(Table["day"], last_day)))
+    Counts = Table["counts"].combine_chunks().flatten().to_numpy(zero_copy_only=False).reshape(-1, bin_count(Type))
+    return Table["day"].to_numpy(), Counts
+
+
+def quantiles(Counts, Type, percentiles=PERCENTILES):
+    # Interpolates inside the bin each percentile falls in, rows are groups of merged histograms
+    low, high, width = SKETCH_BINS[Type]
+    Cumulative = np.cumsum(Counts, axis=1)
+    Total = Cumulative[:, -1:]
+    Results = []
+    for percentile in percentiles:
+        Target = Total * percentile / 100
+        Bin = np.minimum((Cumulative < Target).sum(axis=1), Counts.shape[1] - 1)
+        Rows = np.arange(len(Counts))
+        Before = np.where(Bin > 0, Cumulative[Rows, Bin - 1], 0)
+        Inside = np.maximum(Counts[Rows, Bin], 1)
+        Results.append(low + (Bin + (Target[:, 0] - Before) / Inside) * width)
+    Results = np.column_stack(Results) if Results else np.empty((len(Counts), 0))
+    Results[Total[:, 0] == 0] = np.nan
+    return Results
+
+
+def percentiles(Type, start_date, end_date):
+    """
+    p5/p50/p95 per day, month and weekday between the picked dates (after start_date up to and including end_date),
+    merged from the daily sketches without touching raw rows. None if there are no sketches for Type.
+    """
+    Epoch = pd.Timestamp("1970-01-01")
+    Sketches = read_sketches(Type, (pd.Timestamp(start_date) - Epoch).days + 1, (pd.Timestamp(end_date) - Epoch).days)
+    if Sketches is None:
+        return None
+    Days, Counts = Sketches
+    Columns = [f"p{percentile}" for percentile in PERCENTILES]
+
+    Labels = {
+        "startDate" : Days.astype("datetime64[D]"),
+        "month" : np.datetime_as_string(Days.astype("datetime64[D]"), unit="M"),
+        "DayofWeek" : np.array(Order)[(Days + 3) % 7]}
+    Groups = {}
+    for By, Label in Labels.items():
+        Merged = pd.DataFrame(Counts).groupby(Label).sum()
+        if By == "DayofWeek":
+            Merged = Merged.reindex(Order, fill_value=0)
+        Groups[By] = pd.DataFrame(quantiles(Merged.values, Type), index=Merged.index, columns=Columns)
+    return Groups
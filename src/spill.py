@@ -0,0 +1,250 @@
+import os
+import json
+import shutil
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from pyarrow import feather
+from src.storage import SORT_KEYS, ROW_GROUP_SIZE
+
+SPILL_DIR = "Data/spill"
+CHECKPOINT_FILE = "checkpoint.json"
+MERGED_FILE = "merged.arrow"
+SIDE_PREFIX = "side-"
+# Share of the budget parsed frames may fill before they are spilled, deriving, sorting and converting a run copies it several times
+SPILL_FRACTION = 0.1
+# Share of the budget the merge holds, one block per run
+MERGE_FRACTION = 0.1
+
+
+class Spill:
+    """
+    Collects converted record frames up to a memory budget (MB), then sorts them by type and start and writes
+    them out as an uncompressed Arrow run. The checkpoint lists the finished runs
+    and how many parsed rows they cover, so ingesting the same export again after a crash picks up after the last run
+    instead of starting over.
+    """
+    def __init__(self, budget_mb, export, directory=SPILL_DIR):
+        self.budget = budget_mb * 1024 * 1024
+        self.directory = directory
+        self.pending, self.pending_rows, self.row_bytes = [], 0, None
+        self.checkpoint = {"export" : export, "rows" : 0, "runs" : [], "categories" : {}}
+        try:
+            with open(os.path.join(directory, CHECKPOINT_FILE)) as f:
+                Saved = json.load(f)
+            if Saved["export"] == export:
+                self.checkpoint = Saved
+                print(f"Resuming after {Saved['rows']} parsed rows already spilled to {len(Saved['runs'])} runs")
+        except (OSError, ValueError, KeyError):
+            pass
+        if not self.checkpoint["runs"]:
+            shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory, exist_ok=True)
+        # Side tables are parsed again in full on resume, so whatever a killed run spilled of them is stale
+        for name in os.listdir(directory):
+            if name.startswith(SIDE_PREFIX):
+                os.remove(os.path.join(directory, name))
+        self.rows = self.checkpoint["rows"]
+        self.sides = {}
+
+    @property
+    def done(self):
+        # Parsed rows the checkpointed runs already hold, their batches can be skipped
+        return self.checkpoint["rows"]
+
+    def add(self, frame, rows):
+        # rows counts every parsed row up to and including this frame, before values were dropped.
+        # An empty frame is only kept when nothing else would give the merge a schema.
+        if len(frame) or not (self.pending or self.checkpoint["runs"]):
+            self.pending.append(frame)
+        self.pending_rows += len(frame)
+        self.rows = rows
+        if self.row_bytes is None and len(frame):
+            self.row_bytes = frame.memory_usage(deep=True).sum() / len(frame)
+        if self.pending_rows * (self.row_bytes or 0) >= self.budget * SPILL_FRACTION:
+            self.flush()
+
+    def flush(self):
+        if self.pending:
+            Frames = [frame for frame in self.pending if len(frame)] or self.pending[:1]
+            df = pd.concat(Frames, ignore_index=True)
+            del Frames
+            self.pending = []
+            df = df.sort_values(SORT_KEYS, kind="mergesort")
+            # Every run codes its categories differently, they are stored as strings and recoded once when merged
+            for key in df.columns[df.dtypes == "category"]:
+                Known = set(self.checkpoint["categories"].get(key, []))
+                self.checkpoint["categories"][key] = sorted(Known.union(df[key].cat.categories.astype(str)))
+                df[key] = df[key].astype("string")
+            Run = {"file" : f"run-{len(self.checkpoint['runs']):05d}.arrow", "rows" : len(df),
+                "types" : {Type : int(Rows) for Type, Rows in df.groupby("type", sort=True).size().items()}}
+            path = os.path.join(self.directory, Run["file"])
+            feather.write_feather(pa.Table.from_pandas(df, preserve_index=False), f"{path}.tmp", compression="uncompressed")
+            os.replace(f"{path}.tmp", path)
+            del df
+            self.checkpoint["runs"].append(Run)
+        self.pending, self.pending_rows = [], 0
+        self.checkpoint["rows"] = self.rows
+        with open(os.path.join(self.directory, f"{CHECKPOINT_FILE}.tmp"), "w") as f:
+            json.dump(self.checkpoint, f)
+        os.replace(os.path.join(self.directory, f"{CHECKPOINT_FILE}.tmp"), os.path.join(self.directory, CHECKPOINT_FILE))
+
+    def add_side(self, name, frame):
+        """
+        Holds a typed frame of one of the tables parsed beside the records (workouts, HRV beats, category records...)
+        to the same budget: once a table's pending frames pass SPILL_FRACTION of it they are written out as an Arrow file.
+        """
+        Side = self.sides.setdefault(name, {"pending" : [], "bytes" : 0, "files" : [], "categories" : []})
+        if len(frame) or not (Side["pending"] or Side["files"]):
+            Side["pending"].append(frame)
+        Side["bytes"] += frame.memory_usage(deep=True).sum()
+        if Side["bytes"] >= self.budget * SPILL_FRACTION:
+            self.flush_side(name)
+
+    def flush_side(self, name):
+        Side = self.sides[name]
+        if Side["pending"]:
+            Frames = [frame for frame in Side["pending"] if len(frame)] or Side["pending"][:1]
+            df = pd.concat(Frames, ignore_index=True)
+            del Frames
+            # Stored as strings like the runs, every frame coded its categories differently
+            Side["categories"] = df.columns[df.dtypes == "category"].tolist()
+            for key in Side["categories"]:
+                df[key] = df[key].astype("string")
+            path = os.path.join(self.directory, f"{SIDE_PREFIX}{name}-{len(Side['files']):05d}.arrow")
+            feather.write_feather(pa.Table.from_pandas(df, preserve_index=False), path, compression="uncompressed")
+            Side["files"].append(path)
+        Side["pending"], Side["bytes"] = [], 0
+
+    def side(self, name):
+        # One side table back as a single frame, in the order it was parsed
+        self.flush_side(name)
+        Side = self.sides[name]
+        df = pd.concat([feather.read_table(path).to_pandas() for path in Side["files"]], ignore_index=True)
+        for key in Side["categories"]:
+            df[key] = df[key].astype("category")
+        return df
+
+    def merge(self, path, storage="feather"):
+        """
+        External merge of the spilled runs into one records file sorted by type and start, written as feather
+        (uncompressed, so it can be memory mapped) or Parquet. Each type is merged block by block and no block
+        holds more than MERGE_FRACTION of the budget across all runs.
+        Returns the merged records memory mapped, with each type's row range in the "index" schema metadata.
+        """
+        self.flush()
+        Runs = [feather.read_table(os.path.join(self.directory, Run["file"]), memory_map=True) for Run in self.checkpoint["runs"]]
+        Dictionaries = {key : pa.array(values, pa.string()) for key, values in self.checkpoint["categories"].items()}
+        Schema = merged_schema([Run.schema for Run in Runs], Dictionaries)
+
+        Types = sorted(set().union(*[Run["types"] for Run in self.checkpoint["runs"]]))
+        Starts = [np.cumsum([0] + [Run["types"].get(Type, 0) for Type in Types]) for Run in self.checkpoint["runs"]]
+        Index = {Type : [int(sum(Start[i] for Start in Starts)), int(sum(Start[i + 1] for Start in Starts))] for i, Type in enumerate(Types)}
+        Schema = Schema.with_metadata({"index" : json.dumps(Index)})
+
+        Row_Bytes = max([os.path.getsize(os.path.join(self.directory, Run["file"])) / max(Run["rows"], 1) for Run in self.checkpoint["runs"]] or [1])
+        Block = max(1024, int(self.budget * MERGE_FRACTION / max(len(Runs), 1) / Row_Bytes))
+        Merged = os.path.join(self.directory, MERGED_FILE)
+        with pa.OSFile(f"{Merged}.tmp", "wb") as sink, pa.ipc.new_file(sink, Schema) as writer:
+            for i, Type in enumerate(Types):
+                Slices = [(Run, Start[i], Start[i + 1]) for Run, Start in zip(Runs, Starts) if Start[i + 1] > Start[i]]
+                for Table in merge_slices(Slices, Block, lambda Part: conform(Part, Schema, Dictionaries)):
+                    writer.write_table(Table)
+        os.replace(f"{Merged}.tmp", Merged)
+        del Runs
+
+        if storage == "parquet":
+            Records = feather.read_table(Merged, memory_map=True)
+            with pq.ParquetWriter(path, Schema, compression="zstd", use_dictionary=True, write_statistics=True) as writer:
+                for batch in Records.to_batches():
+                    writer.write_batch(batch, row_group_size=ROW_GROUP_SIZE)
+            return Records
+        os.replace(Merged, path)
+        return feather.read_table(path, memory_map=True)
+
+    def close(self):
+        # Everything is written, a later run of the same export starts from scratch.
+        # A mapped merge result stays readable after it is unlinked.
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+def merged_schema(Schemas, Dictionaries):
+    # A column that is entirely null in one run takes its type from a run that has values
+    Fields = []
+    for name in Schemas[0].names:
+        Types = [Schema.field(name).type for Schema in Schemas if not pa.types.is_null(Schema.field(name).type)]
+        Type = pa.dictionary(pa.int32(), pa.string()) if name in Dictionaries else (Types[0] if Types else pa.null())
+        Fields.append(pa.field(name, Type))
+    return pa.schema(Fields)
+
+
+def conform(Table, Schema, Dictionaries):
+    # One schema and one dictionary per category column for every merged batch, as the Arrow file format requires
+    Columns = []
+    for Field in Schema:
+        Column = Table.column(Field.name).combine_chunks()
+        if Field.name in Dictionaries:
+            Column = pa.DictionaryArray.from_arrays(pc.index_in(Column.cast(pa.string()), value_set=Dictionaries[Field.name]), Dictionaries[Field.name])
+        else:
+            Column = Column.cast(Field.type)
+        Columns.append(Column)
+    return pa.Table.from_arrays(Columns, schema=Schema.remove_metadata())
+
+
+def merge_slices(Slices, Block, conform):
+    """
+    k-way merge on startDate of sorted row ranges [start, end) of several tables, Block rows from each at a time.
+    Each round emits every row up to the smallest last key among the blocks that do not finish their range,
+    so nothing held back can sort before what was emitted. Ties keep run order: rows on that key go out run by run,
+    up to the first run whose next block may hold more of them.
+    conform brings the parts of each round to one schema before they are combined.
+    """
+    Position = [start for _, start, _ in Slices]
+    while True:
+        Live = [i for i, (_, _, end) in enumerate(Slices) if Position[i] < end]
+        if not Live:
+            return
+        Blocks, Keys = {}, {}
+        for i in Live:
+            Table, _, end = Slices[i]
+            Blocks[i] = Table.slice(Position[i], min(Block, end - Position[i]))
+            Keys[i] = Blocks[i].column("startDate").cast(pa.int64()).to_numpy()
+        Open = [Keys[i][-1] for i in Live if Position[i] + len(Keys[i]) < Slices[i][2]]
+        Bound = min(Open) if Open else None
+        Parts = []
+        Ties = True
+        for i in Live:
+            if Bound is None:
+                Rows = len(Keys[i])
+            elif Ties:
+                Rows = int(np.searchsorted(Keys[i], Bound, side="right"))
+                Ties = not (Rows == len(Keys[i]) and Position[i] + Rows < Slices[i][2])
+            else:
+                Rows = int(np.searchsorted(Keys[i], Bound, side="left"))
+            if Rows:
+                Parts.append(conform(Blocks[i].slice(0, Rows)))
+                Position[i] += Rows
+        Table = pa.concat_tables(Parts) if len(Parts) > 1 else Parts[0]
+        yield Table.take(pc.sort_indices(Table, sort_keys=[("startDate", "ascending")]))
+
+
+def type_frames(records, columns=None, rows=None):
+    """
+    Records one type at a time: a frame is passed through whole, a merged table is sliced by its type index.
+    With rows, a type is further cut into frames of at most that many rows, still in start order,
+    so the builders fed by them combine what one chunk leaves to the next.
+    """
+    if isinstance(records, pd.DataFrame):
+        yield records if columns is None else records[columns]
+        return
+    Index = json.loads(records.schema.metadata[b"index"])
+    if not Index:
+        yield (records if columns is None else records.select(columns)).to_pandas()
+        return
+    for Type, (start, end) in Index.items():
+        Step = max(end - start if rows is None else rows, 1)
+        for first in range(start, max(end, start + 1), Step):
+            Slice = records.slice(first, min(Step, end - first))
+            yield (Slice if columns is None else Slice.select(columns)).to_pandas()
@@ -0,0 +1,53 @@
+import os
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from pyarrow import feather
+
+STORAGE_FORMATS = {"feather" : ".feather", "parquet" : ".parquet"}
+ROW_GROUP_SIZE = 64 * 1024
+SORT_KEYS = ["type", "startDate"]
+
+
+def storage_path(output_file, storage="feather"):
+    return os.path.splitext(output_file)[0] + STORAGE_FORMATS[storage]
+
+
+def write_records(df, path, storage="feather"):
+    """
+    feather: one un-partitioned file, fastest to write.
+    parquet: zstd + dictionary encoded, rows sorted by type and date so each row group covers a narrow
+    slice and its min/max statistics let range reads skip the rest.
+    """
+    if storage == "parquet":
+        table = pa.Table.from_pandas(df.sort_values(SORT_KEYS, kind="mergesort"), preserve_index=False)
+        pq.write_table(table, path, compression="zstd", use_dictionary=True, write_statistics=True, row_group_size=ROW_GROUP_SIZE)
+    elif storage == "feather":
+        df.to_feather(path)
+    else:
+        raise ValueError(f"Unknown storage format {storage}, expected one of {list(STORAGE_FORMATS)}")
+
+
+def read_records(path, Type=None, start=None, end=None, columns=None):
+    """
+    Records of one type with start <= startDate < end, as an Arrow table.
+    Parquet pushes the predicate down to row group statistics, feather has to read everything and filter.
+    """
+    if path.endswith(STORAGE_FORMATS["parquet"]):
+        Schema = pq.read_schema(path)
+    else:
+        Table = feather.read_table(path)
+        Schema = Table.schema
+
+    Filter = None
+    for column, Compare, value in [("type", pc.equal, Type), ("startDate", pc.greater_equal, start), ("startDate", pc.less, end)]:
+        if value is not None:
+            value = pd.Timestamp(value) if column == "startDate" else value
+            Expression = Compare(pc.field(column), pa.scalar(value, type=Schema.field(column).type))
+            Filter = Expression if Filter is None else Filter & Expression
+
+    if path.endswith(STORAGE_FORMATS["parquet"]):
+        return pq.read_table(path, columns=columns, filters=Filter)
+    Table = Table if Filter is None else Table.filter(Filter)
+    return Table if columns is None else Table.select(columns)
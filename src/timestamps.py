@@ -0,0 +1,103 @@
+import numpy as np
+
+# export.xml writes every date as "2020-03-01 10:00:00 -0500", in the offset the device was in at the time
+TIMESTAMP_WIDTH = 25
+DIGITS = [0, 1, 2, 3, 5, 6, 8, 9, 11, 12, 14, 15, 17, 18, 21, 22, 23, 24]
+SEPARATORS = {4 : "-", 7 : "-", 10 : " ", 13 : ":", 16 : ":", 19 : " "}
+DAY = 86400
+# Weekday codes count from Monday, 1970-01-01 was a Thursday
+EPOCH_WEEKDAY = 3
+DAY_NAMES = np.array(["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"], dtype=object)
+
+
+def number(Chars, first, width):
+    Value = Chars[first].astype(np.int32) - 48
+    for i in range(first + 1, first + width):
+        Value = Value * 10 + Chars[i] - 48
+    return Value
+
+
+def parse_timestamps(Strings):
+    """
+    Fixed format "YYYY-MM-DD HH:MM:SS ±HHMM" strings to int64 seconds of local wall time since 1970-01-01
+    and each one's UTC offset in seconds, by integer math on the raw bytes, so offsets may differ from row to row.
+    Returns (Local, Offset, Valid): strings in any other format, missing ones and impossible dates
+    are False in Valid, with 0 for their time and offset.
+    """
+    Raw = np.asarray(Strings, dtype=object)
+    try:
+        # None and NaN become "None" and "nan", which fail the format checks like any other bad string
+        Raw = Raw.astype(f"S{TIMESTAMP_WIDTH + 1}")
+    except UnicodeEncodeError:
+        Raw = np.array([str(Value).encode("utf-8", "replace")[:TIMESTAMP_WIDTH + 1] for Value in Raw], dtype=f"S{TIMESTAMP_WIDTH + 1}")
+    # One row per character position, so every field is read from contiguous memory
+    Chars = np.ascontiguousarray(Raw.view(np.uint8).reshape(len(Raw), TIMESTAMP_WIDTH + 1).T)
+    Valid = ((Chars[DIGITS] - 48) <= 9).all(axis=0) & (Chars[TIMESTAMP_WIDTH] == 0)
+    Valid &= (Chars[20] == ord("+")) | (Chars[20] == ord("-"))
+    for column, separator in SEPARATORS.items():
+        Valid &= Chars[column] == ord(separator)
+
+    Year, Month, Day = number(Chars, 0, 4), number(Chars, 5, 2), number(Chars, 8, 2)
+    Hour, Minute, Second = number(Chars, 11, 2), number(Chars, 14, 2), number(Chars, 17, 2)
+    Days = days_from_civil(Year, Month, Day)
+    # A day past the end of its month comes back from the round trip as another date
+    Valid &= (Month >= 1) & (Month <= 12) & (Day >= 1) & (Hour < 24) & (Minute < 60) & (Second < 60) & (number(Chars, 23, 2) < 60)
+    Valid &= (np.stack(civil_from_days(Days)) == np.stack([Year, Month, Day])).all(axis=0)
+
+    Local = Days.astype(np.int64) * DAY + (Hour * 3600 + Minute * 60 + Second)
+    Offset = np.where(Chars[20] == ord("-"), -60, 60) * (number(Chars, 21, 2) * 60 + number(Chars, 23, 2))
+    return np.where(Valid, Local, 0), np.where(Valid, Offset, 0).astype(np.int64), Valid
+
+
+def days_from_civil(Year, Month, Day):
+    # Proleptic Gregorian date to days since 1970-01-01, years counted from March so leap days come last
+    Year = Year - (Month <= 2)
+    Era = Year // 400
+    Year_Of_Era = Year - Era * 400
+    Day_Of_Year = (153 * ((Month + 9) % 12) + 2) // 5 + Day - 1
+    return Era * 146097 + Year_Of_Era * 365 + Year_Of_Era // 4 - Year_Of_Era // 100 + Day_Of_Year - 719468
+
+
+def civil_from_days(Days):
+    # Inverse of days_from_civil, (year, month, day)
+    Days = Days + 719468
+    Era = Days // 146097
+    Day_Of_Era = Days - Era * 146097
+    Year_Of_Era = (Day_Of_Era - Day_Of_Era // 1460 + Day_Of_Era // 36524 - Day_Of_Era // 146096) // 365
+    Day_Of_Year = Day_Of_Era - (365 * Year_Of_Era + Year_Of_Era // 4 - Year_Of_Era // 100)
+    March_Month = (5 * Day_Of_Year + 2) // 153
+    Day = Day_Of_Year - (153 * March_Month + 2) // 5 + 1
+    Month = np.where(March_Month < 10, March_Month + 3, March_Month - 9)
+    return Year_Of_Era + Era * 400 + (Month <= 2), Month, Day
+
+
+def calendar_fields(Local):
+    """
+    Year, month, day, hour and weekday code (Monday 0) of int64 seconds of local wall time.
+    """
+    Days = Local // DAY
+    Year, Month, Day = civil_from_days(Days)
+    return Year, Month, Day, Local % DAY // 3600, (Days + EPOCH_WEEKDAY) % 7
+
+
+def month_labels(Year, Month):
+    # "YYYY-MM" per row, one string per month in the span shared by every row of it
+    Months = Year * 12 + Month - 1
+    if not len(Months):
+        return np.array([], dtype=object)
+    First = Months.min()
+    Labels = np.array([f"{Index // 12:04d}-{Index % 12 + 1:02d}" for Index in range(First, Months.max() + 1)], dtype=object)
+    return Labels[Months - First]
+
+
+def wall_clock(Local, Valid=None):
+    # Naive datetime64[ns] of local wall time, NaT where Valid is False
+    Nanoseconds = Local * 10**9
+    if Valid is not None:
+        Nanoseconds = np.where(Valid, Nanoseconds, np.iinfo(np.int64).min)
+    return Nanoseconds.view("datetime64[ns]")
+
+
+def iso_offset(minutes):
+    # ISO 8601 "-05:00" style offset
+    return f"{'-' if minutes < 0 else '+'}{abs(int(minutes)) // 60:02d}:{abs(int(minutes)) % 60:02d}"
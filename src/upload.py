@@ -1,69 +1,511 @@
-import os
+import numpy as np
 import pandas as pd
-import tempfile
+import pyarrow as pa
 import zipfile
 from lxml import etree
-import json, io
+import time
+import queue
+import threading
+import re
+import html
 from pyarrow import feather
+from src.options import Get_Drop_Choices
+from src.manifest import Write_JSON, summarize, version
+from src.storage import write_records, storage_path
+from src.pyramid import carry_pyramids, write_pyramid
+from src.sketches import build_sketches, combine_sketches, write_sketches
+from src.prefix import daily_totals, add_totals, prefix_table, write_prefix
+from src.zones import value_minutes, zone_table, write_zones, zone_rollups
+from src.rollups import daily_stats, combine_stats, rollup_columns, write_rollups
+from src.categories import CATEGORY_TYPES, CATEGORY_KEYS, category_frame, build_categories, write_categories
+from src.spill import Spill, type_frames
+from src.timestamps import DAY_NAMES, parse_timestamps, calendar_fields, month_labels, wall_clock
 
 import warnings
 warnings.filterwarnings("ignore")
 
-JSON_FILE = "Health_Data/config.json"
-Date_Format = "%Y-%m-%d %H:%M:%S %z"        
 DATETIME_KEYS = ["startDate", "endDate"]
 NUMERIC_KEYS = ["value"]
-OTHER_KEYS = ["type", "sourceName","device", "unit", "MetadataEntry", "HeartRateVariabilityMetadataList"]
+OTHER_KEYS = ["type", "sourceName","device", "unit"]
 ALL_KEYS = OTHER_KEYS + DATETIME_KEYS + NUMERIC_KEYS
+XML_PATH = "apple_health_export/export.xml"
+HEARTBEATS_FILE = "heartbeats.feather"
+Beat_Format = "%I:%M:%S.%f %p"
+# Pipeline sizing: inflated bytes per chunk, Record rows per batch and how many of either may wait between stages
+CHUNK_SIZE = 1024 * 1024
+BATCH_ROWS = 20_000
+QUEUE_DEPTH = 4
+# How often a stage blocked on a queue checks whether it was told to stop
+POLL_SECONDS = 0.1
+# Rough size of one parsed Record row, and the share of a memory budget the rows in flight between stages may take
+ROW_BYTES = 1024
+PIPELINE_FRACTION = 0.1
 
-def Write_JSON(Watch, First_Instance, Last_Instance):
+# Parse-time allowlist: only these Record types are materialised, by default the ones the dashboard graphs.
+# Sources default to the first Apple Watch found by a pre-scan of the raw XML.
+RECORD_TYPES = [Choice["value"] for Choice in Get_Drop_Choices()]
+SOURCE_MATCH = "Watch"
+Record_Source = re.compile(rb'<Record type="[^"]*" sourceName="([^"]*)"')
+
+# MetadataEntry children kept as nullable typed columns on the records table, everything else is dropped
+METADATA_KEYS = {"HKMetadataKeyHeartRateMotionContext" : "Int8", "HKWasUserEntered" : "boolean", "HKTimeZone" : "category", "HKAverageMETs" : "float32"}
+# utcOffset is the minutes east of UTC startDate and endDate are written in, the offset of startDate in export.xml
+RECORD_COLUMNS = ["type", "sourceName", "month", "day", "year", "hour", "DayofWeek", "startDate", "endDate", "utcOffset", "value", "unit", "device", "recordId", *METADATA_KEYS]
+# Share of a memory budget one chunk of records may take as Arrow, the summaries copy it several times over
+SUMMARY_FRACTION = 0.05
+# What the manifest and the summary tables read from the records
+SUMMARY_COLUMNS = ["type", "sourceName", "startDate", "endDate", "utcOffset", "value", "unit", "recordId"]
+
+# Columnar schemas for the non-Record elements, parsed in the same pass as the records
+WORKOUT_SCHEMA = {"workoutActivityType" : "category", "duration" : "float", "durationUnit" : "category",
+    "totalDistance" : "float", "totalDistanceUnit" : "category", "totalEnergyBurned" : "float", "totalEnergyBurnedUnit" : "category",
+    "sourceName" : "category", "device" : "category", "startDate" : "datetime", "endDate" : "datetime"}
+ACTIVITY_SUMMARY_SCHEMA = {"dateComponents" : "date", "activeEnergyBurned" : "float", "activeEnergyBurnedGoal" : "float",
+    "activeEnergyBurnedUnit" : "category", "appleMoveTime" : "float", "appleMoveTimeGoal" : "float", "appleExerciseTime" : "float",
+    "appleExerciseTimeGoal" : "float", "appleStandHours" : "float", "appleStandHoursGoal" : "float"}
+CORRELATION_SCHEMA = {"type" : "category", "sourceName" : "category", "device" : "category", "startDate" : "datetime", "endDate" : "datetime"}
+TABLES = {
+    "Workout" : ("workouts.feather", WORKOUT_SCHEMA),
+    "ActivitySummary" : ("activity_summaries.feather", ACTIVITY_SUMMARY_SCHEMA),
+    "Correlation" : ("correlations.feather", CORRELATION_SCHEMA)}
+
+def typed_frame(rows, schema):
+    # Dates are naive local wall time like the records, all in the offset of the first one, kept in utcOffset.
+    # Unparseable dates are NaT.
+    df = pd.DataFrame(rows, columns=list(schema))
+    Offset = None
+    for k, kind in schema.items():
+        if kind == "datetime":
+            Local, Offsets, Valid = parse_timestamps(df[k].values)
+            if Offset is None:
+                Offset = Offsets
+            df[k] = wall_clock(Local - Offsets + Offset, Valid)
+        elif kind == "date":
+            df[k] = pd.to_datetime(df[k], format="%Y-%m-%d")
+        elif kind == "float":
+            df[k] = pd.to_numeric(df[k], errors="coerce").astype("float64")
+        else:
+            df[k] = df[k].astype(kind)
+    if Offset is not None:
+        df["utcOffset"] = (Offset // 60).astype(np.int16)
+    return df
+
+
+def typed_metadata(df):
+    for key, kind in METADATA_KEYS.items():
+        if kind == "category":
+            df[key] = df[key].astype(kind)
+        else:
+            # Values like "3.2 kcal/hr·kg" keep only their leading number
+            df[key] = pd.to_numeric(df[key].astype("string").str.extract(r"^\s*(-?[\d.]+)", expand=False), errors="coerce").astype(kind)
+    return df
+
+
+def beat_frame(beats):
+    # One row per beat: its HRV record, bpm and the time of day it was read at
+    clock = pd.to_datetime(pd.Series(beats["time"], dtype=object), format=Beat_Format) - pd.Timestamp("1900-01-01")
+    return pd.DataFrame({"recordId" : np.repeat(np.asarray(beats["recordId"], dtype=np.int64), np.diff(beats["offsets"])),
+        "bpm" : np.asarray(beats["bpm"], dtype=np.float32), "clock" : clock.values})
+
+
+def write_heartbeats(beats, df):
+    """
+    Beat-to-beat readings from HeartRateVariabilityMetadataList (beat_frame rows) as one row per HRV record:
+    recordId plus list<float32> bpm and list<int64> time (UTC ns), i.e. flat value arrays sharing one offsets array.
+    """
+    ids, first = np.unique(beats["recordId"].values, return_index=True)
+    Parents = df.set_index("recordId").reindex(ids)
+    starts = Parents["startDate"]
+    keep = starts.notnull().values
+
+    # Beat times are only a wall clock time, anchor them to the day the parent record started on
+    counts = np.diff(np.append(first, len(beats)))
+    parent = starts.repeat(counts)
+    times = parent.dt.normalize().values + beats["clock"].values
+    times = np.where(times < parent.values - np.timedelta64(12, "h"), times + np.timedelta64(1, "D"), times)
+    # Starts are naive local wall time, shift the beats back to UTC
+    times = times - np.repeat(Parents["utcOffset"].fillna(0).values.astype(np.int64), counts) * np.timedelta64(1, "m")
+
+    lengths = counts[keep]
+    mask = np.repeat(keep, counts)
+    kept_offsets = pa.array(np.concatenate([[0], np.cumsum(lengths)]).astype(np.int32))
+    table = pa.table({
+        "recordId" : pa.array(ids[keep]),
+        "bpm" : pa.ListArray.from_arrays(kept_offsets, pa.array(beats["bpm"].values[mask])),
+        "time" : pa.ListArray.from_arrays(kept_offsets, pa.array(times.astype("datetime64[ns]").astype(np.int64)[mask]))})
+    feather.write_feather(table, f"Data/{HEARTBEATS_FILE}")
+    return table
+
+
+class Stopped(Exception):
+    # Raised in a stage once the stop event is set, its consumer is gone
+    pass
+
+
+def put(out, item, Stats, stop=None):
+    # Time spent here is back-pressure from the next stage
+    start = time.perf_counter()
+    while True:
+        if stop is not None and stop.is_set():
+            raise Stopped
+        try:
+            out.put(item, timeout=POLL_SECONDS)
+            break
+        except queue.Full:
+            pass
+    Stats["blocked s"] += time.perf_counter() - start
+
+
+def take(source, Stats, stop=None):
+    # Time spent here is starvation by the previous stage, whose errors are re-raised downstream
+    start = time.perf_counter()
+    while True:
+        if stop is not None and stop.is_set():
+            raise Stopped
+        try:
+            item = source.get(timeout=POLL_SECONDS)
+            break
+        except queue.Empty:
+            pass
+    Stats["waiting s"] += time.perf_counter() - start
+    if isinstance(item, BaseException):
+        raise item
+    return item
+
+
+def stage(func, source, out, Stats, stop, **kwargs):
+    def run():
+        try:
+            func(source, out, Stats, stop, **kwargs)
+        except Stopped:
+            pass
+        except BaseException as e:
+            try:
+                put(out, e, Stats, stop)
+            except Stopped:
+                pass
+    thread = threading.Thread(target=run, name=func.__name__, daemon=True)
+    thread.start()
+    return thread
+
+
+def drain(source):
+    # Drops whatever a stopped stage left queued
+    while True:
+        try:
+            source.get_nowait()
+        except queue.Empty:
+            return
+
+
+def inflate(zip_str, out, Stats, stop):
+    with zipfile.ZipFile(zip_str, "r") as f, f.open(XML_PATH) as xml:
+        while True:
+            start = time.perf_counter()
+            chunk = xml.read(CHUNK_SIZE)
+            Stats["busy s"] += time.perf_counter() - start
+            if not chunk:
+                break
+            Stats["items"] += 1
+            Stats["MB"] += len(chunk) / 1e6
+            put(out, chunk, Stats, stop)
+    put(out, None, Stats, stop)
+
+
+def detect_source(zip_str, match=SOURCE_MATCH):
+    """
+    First Record sourceName containing `match`, found with a byte regex over the inflated XML
+    without parsing it. Stops at the first hit, None if no source matches.
+    """
+    Tail = b""
+    with zipfile.ZipFile(zip_str, "r") as f, f.open(XML_PATH) as xml:
+        while True:
+            chunk = xml.read(CHUNK_SIZE)
+            if not chunk:
+                return None
+            Text = Tail + chunk
+            for name in Record_Source.findall(Text):
+                name = html.unescape(name.decode("utf-8"))
+                if match in name:
+                    return name
+            # A Record tag split across chunks is matched again with the next one
+            Tail = Text[max(Text.rfind(b"<"), 0):]
+
+
+def tokenize(source, out, Stats, stop, types=RECORD_TYPES, sources=None, category_types=CATEGORY_TYPES, batch_rows=BATCH_ROWS):
+    """
+    Feeds the inflated chunks to a pull parser and routes each element to its own table.
+    Records outside the type allowlists, and numeric records from other sources (None keeps every source), are skipped
+    on their attributes alone, before a row is built. Category records are kept whatever their source.
+    Record rows go downstream in batches, and so do the TABLES rows, category records and HRV beats
+    (whole lists, a record's beats are never split), so a memory budget holds for them as well.
+    """
+    types = set(types)
+    category_types = set(category_types)
+    categories = []
+    parser = etree.XMLPullParser(events=("end",), tag=["Record", *TABLES], huge_tree=True)
+    records = []
+    record_id = 0
+    tables = {tag : [] for tag in TABLES}
+    beats = {"recordId" : [], "offsets" : [0], "bpm" : [], "time" : []}
+    while True:
+        chunk = take(source, Stats, stop)
+        start = time.perf_counter()
+        if chunk is None:
+            parser.close()
+        else:
+            parser.feed(chunk)
+            Stats["MB"] += len(chunk) / 1e6
+        for _, elem in parser.read_events():
+            if elem.tag == "Record" and elem.get("type") in category_types:
+                # Sleep and other category records are kept from every source, the iPhone or another app often logs them
+                categories.append([elem.get(key) for key in CATEGORY_KEYS])
+            elif elem.tag == "Record" and (elem.get("type") not in types or (sources is not None and elem.get("sourceName") not in sources)):
+                Stats["skipped"] += 1
+            elif elem.tag == "Record":
+                row = {key: elem.get(key) for key in ALL_KEYS}
+                row["recordId"] = record_id
+                record_id += 1
+                for child in elem:
+                    if child.tag == "MetadataEntry":
+                        if child.get("key") in METADATA_KEYS:
+                            row[child.get("key")] = child.get("value")
+                    elif child.tag == "HeartRateVariabilityMetadataList":
+                        for beat in child:
+                            beats["bpm"].append(beat.get("bpm"))
+                            beats["time"].append(beat.get("time"))
+                        beats["recordId"].append(row["recordId"])
+                        beats["offsets"].append(len(beats["bpm"]))
+                records.append(row)
+            else:
+                tables[elem.tag].append([elem.get(key) for key in TABLES[elem.tag][1]])
+
+            # Records inside a Correlation are cleared with it, top level elements are dropped as we go
+            parent = elem.getparent()
+            if parent is not None and parent.tag == "HealthData":
+                elem.clear()
+                while elem.getprevious() is not None:
+                    del parent[0]
+        Stats["busy s"] += time.perf_counter() - start
+
+        if len(records) >= batch_rows or (chunk is None and records):
+            Stats["items"] += len(records)
+            put(out, ("records", records), Stats, stop)
+            records = []
+        # The side tables are sent at least once, even empty, so every one of them gets a frame
+        for tag, rows in tables.items():
+            if len(rows) >= batch_rows or chunk is None:
+                put(out, (tag, rows), Stats, stop)
+                tables[tag] = []
+        if len(categories) >= batch_rows or chunk is None:
+            put(out, ("categories", categories), Stats, stop)
+            categories = []
+        if len(beats["bpm"]) >= batch_rows or chunk is None:
+            put(out, ("beats", beats), Stats, stop)
+            beats = {"recordId" : [], "offsets" : [0], "bpm" : [], "time" : []}
+        if chunk is None:
+            break
+    put(out, ("end", None), Stats, stop)
+
+
+def convert_records(rows):
+    """
+    Typed record frame with the calendar columns, derived from the date strings by integer math.
+    startDate and endDate are always naive local wall times in the offset of startDate, kept in utcOffset,
+    so a record spanning a change of offset keeps its duration and the dtype never depends on the export.
+    Rows with a missing or malformed date are dropped like rows without a numeric value.
+    """
+    df = typed_metadata(pd.DataFrame(rows, columns=ALL_KEYS + ["recordId", *METADATA_KEYS]))
+    Start, Offset, Start_Valid = parse_timestamps(df["startDate"].values)
+    End, End_Offset, End_Valid = parse_timestamps(df["endDate"].values)
+    Year, Month, Day, Hour, Weekday = calendar_fields(Start)
+    df["startDate"] = wall_clock(Start)
+    df["endDate"] = wall_clock(End - End_Offset + Offset)
+    df["utcOffset"] = (Offset // 60).astype(np.int16)
+    df["year"], df["month"], df["day"], df["hour"] = Year, month_labels(Year, Month), Day, Hour
+    df["DayofWeek"] = DAY_NAMES[Weekday]
+    for k in NUMERIC_KEYS:
+        # some rows have non-numeric values, so coerce and drop NaNs
+        df[k] = pd.to_numeric(df[k], errors="coerce")
+    return df[df["value"].notnull().values & Start_Valid & End_Valid][RECORD_COLUMNS]
+
+
+def parse_health_xml(zip_str, types=RECORD_TYPES, sources=None, category_types=CATEGORY_TYPES, spill=None):
+    """
+    Streams export.xml out of the ZIP through three overlapping stages joined by bounded queues:
+    inflate (thread) -> tokenize (thread) -> typed record frames (calling thread).
+    Returns the records frame, {tag : frame} for the TABLES elements, the HRV beats (beat_frame), the category records
+    (category_frame) and per-stage counters. With a Spill the frames go to it instead and the records frame is None,
+    rows its checkpoint already covers are skipped without being converted and batches shrink to fit its budget.
+    The side tables are spilled under the same budget and read back once parsing is done.
+    """
+    Stats = {name : {"items" : 0, "skipped" : 0, "MB" : 0.0, "busy s" : 0.0, "waiting s" : 0.0, "blocked s" : 0.0} for name in ["inflate", "tokenize", "convert"]}
+    Chunks = queue.Queue(maxsize=QUEUE_DEPTH)
+    Batches = queue.Queue(maxsize=QUEUE_DEPTH)
+    stop = threading.Event()
+    batch_rows = BATCH_ROWS if spill is None else int(min(BATCH_ROWS, max(1000, spill.budget * PIPELINE_FRACTION / ((QUEUE_DEPTH + 2) * ROW_BYTES))))
+    Threads = [stage(inflate, zip_str, Chunks, Stats["inflate"], stop),
+        stage(tokenize, Chunks, Batches, Stats["tokenize"], stop, types=types, sources=sources, category_types=category_types, batch_rows=batch_rows)]
     try:
-        Data = {"Apple Watch Name" : Watch, "Data Upload Date" : "Timestamp", "First Date Instance" : First_Instance, "Last Date Instance" : Last_Instance}
-        obj = json.dumps(Data, indent = 4)
-        with open(JSON_FILE, "w") as f:
-            f.write(obj)
-    except Exception as e:
-        print(f"{e} error with json")
-
-
-def health_xml_to_feather(zip_str, output_file, remove_zip=False):
-    with tempfile.TemporaryDirectory() as tmpdirname:
-        f = zipfile.ZipFile(zip_str, "r")
-        f.extractall(tmpdirname)
-        xml_path = os.path.join(tmpdirname, "apple_health_export/export.xml")
-        tree = etree.parse(xml_path)
-        records = tree.xpath("//Record")
-        df = pd.DataFrame([{key: r.get(key) for key in ALL_KEYS}
-                           for r in records])
-
-        # Clean up key types
-        for k in DATETIME_KEYS:
-            df[k] = pd.to_datetime(df[k])
-        for k in NUMERIC_KEYS:
-            # some rows have non-numeric values, so coerce and drop NaNs
-            df[k] = pd.to_numeric(df[k], errors="coerce")
-            df = df[df["value"].notnull()]
-            df = df.reset_index()
-            del df["index"]
-            df['startDate'] = pd.to_datetime(df['startDate'],format=Date_Format)
-            df['endDate'] = pd.to_datetime(df['endDate'],format=Date_Format)
-            df['year'] = df['startDate'].dt.year
-            df['month'] = df['startDate'].dt.to_period('M')
-
-            df["month"] = df["month"].map(str)
-
-            df['day'] = df['startDate'].dt.day
-            df['hour'] = df['startDate'].dt.hour
-            df['DayofWeek'] = df['startDate'].dt.day_name()
-            df = df[["type", "sourceName", 'month',"day", "year", "hour", "DayofWeek", "startDate", "endDate", "value", "unit", "device", "MetadataEntry", "HeartRateVariabilityMetadataList"]]
-            Source_List = df["sourceName"].unique().tolist()
-            Location = [i for i, string in enumerate(Source_List) if 'Watch' in string]
-            Watch = Source_List[int(Location[0])]
-            df = df[df["sourceName"] == Watch]
-            df.reset_index(0, inplace=True)
-            del df["index"]
-
-            df.to_feather(f"Data/{output_file}")
+        frames, Sides, Parsed = convert_batches(Batches, Stats["convert"], spill)
+    finally:
+        # Stages still running when conversion stops, failed or not, are told to stop and their queues emptied,
+        # so no thread or inflated chunk outlives the ingestion
+        stop.set()
+        for thread in Threads:
+            thread.join()
+        drain(Chunks)
+        drain(Batches)
+
+    Sides = {name : spill.side(name) if spill is not None else concat_frames(Frames) for name, Frames in Sides.items()}
+    tables = {tag : Sides[tag] for tag in TABLES}
+    if spill is not None:
+        spill.add(convert_records([]), Parsed)
+        return None, tables, Sides["beats"], Sides["categories"], Stats
+    df = pd.concat(frames, ignore_index=True) if frames else convert_records([])
+    # Each batch built its own categories, unify them once
+    for key, kind in METADATA_KEYS.items():
+        if kind == "category":
+            df[key] = df[key].astype(kind)
+    return df, tables, Sides["beats"], Sides["categories"], Stats
+
+
+def convert_batches(Batches, Stats, spill=None):
+    """
+    The calling thread's stage: typed frames of the record and side table batches until tokenize ends.
+    Returns the record frames (none with a Spill, which takes them), {side table : frames} and the parsed row count.
+    """
+    frames = []
+    Sides = {name : [] for name in [*TABLES, "beats", "categories"]}
+    Parsed = 0
+    while True:
+        kind, item = take(Batches, Stats)
+        if kind == "end":
+            break
+        if kind in Sides:
+            start = time.perf_counter()
+            frame = side_frame(kind, item)
+            if spill is not None:
+                spill.add_side(kind, frame)
+            else:
+                Sides[kind].append(frame)
+            Stats["busy s"] += time.perf_counter() - start
+            continue
+        Done = 0 if spill is None else min(len(item), max(spill.done - Parsed, 0))
+        Parsed += len(item)
+        if Done:
+            Stats["skipped"] += Done
+            item = item[Done:]
+            if not item:
+                continue
+        start = time.perf_counter()
+        frame = convert_records(item)
+        if spill is not None:
+            spill.add(frame, Parsed)
+        else:
+            frames.append(frame)
+        Stats["busy s"] += time.perf_counter() - start
+        Stats["items"] += len(item)
+    return frames, Sides, Parsed
+
+
+def side_frame(kind, rows):
+    # Typed frame of one batch of a side table, far smaller than its strings
+    if kind == "beats":
+        return beat_frame(rows)
+    if kind == "categories":
+        return category_frame(rows)
+    return typed_frame(rows, TABLES[kind][1])
+
+
+def concat_frames(frames):
+    # Frames of one side table as one, with the categories every batch coded differently unified
+    df = pd.concat(frames, ignore_index=True)
+    for key in frames[0].columns[frames[0].dtypes == "category"]:
+        df[key] = df[key].astype("category")
+    return df
+
+
+def print_stage_stats(Stats):
+    Table = pd.DataFrame(Stats).T
+    Table["items/s"] = Table["items"] / Table["busy s"].where(Table["busy s"] > 0)
+    print(Table.round(3).to_string())
+    print(f"Bottleneck stage: {Table['busy s'].idxmax()}")
+
+
+def export_fingerprint(zip_str, types, sources, category_types):
+    # Identifies one export and the filters it is parsed with, a checkpoint only resumes the same combination
+    with zipfile.ZipFile(zip_str, "r") as f:
+        Info = f.getinfo(XML_PATH)
+    return {"xml" : f"{Info.CRC:08x}-{Info.file_size}", "types" : sorted(types), "sources" : sources, "category_types" : sorted(category_types)}
+
+
+def write_summaries(frames, beats, categories, Watch, records_file):
+    """
+    Manifest, heartbeats, pyramid, sketches, prefix sums, zones, categories and the browser rollups.
+    frames can be the whole records frame or chunks of a spilled ingestion in type then start order,
+    every builder folds what one chunk leaves open (a bucket, a day, the gap to the next sample) into the next.
+    """
+    Summaries, Parents, Sketches, Stats, Minutes, Counts = [], [], [], [], [], []
+    Totals = {}
+    Carry = None
+    Beat_Records = beats["recordId"].unique()
+    def chunks():
+        # The pyramid is written as the frames go past, the other summaries are small enough to collect
+        nonlocal Carry
+        for frame in frames:
+            Summaries.append(summarize(frame))
+            Parents.append(frame.loc[frame["recordId"].isin(Beat_Records), ["recordId", "startDate", "utcOffset"]])
+            Sketches.append(build_sketches(frame))
+            add_totals(Totals, daily_totals(frame))
+            Stats.append(daily_stats(frame))
+            Chunk_Minutes, Chunk_Counts, Carry = value_minutes(frame, Carry)
+            Minutes.append(Chunk_Minutes)
+            Counts.append(Chunk_Counts)
+            yield frame
+    write_pyramid(carry_pyramids(chunks()))
+
+    Write_JSON(Summaries, Watch, records_file)
+    write_heartbeats(beats, pd.concat(Parents))
+    write_sketches(combine_sketches(Sketches))
+    write_prefix(prefix_table(Totals))
+    Zones = zone_table(Minutes, Counts, Carry)
+    write_zones(Zones)
+    Rollups = rollup_columns(combine_stats(Stats))
+    Rollups["zones"] = zone_rollups(Zones)
+    write_categories(build_categories(categories))
+    write_rollups(Rollups, version())
+
+
+def health_xml_to_feather(zip_str, output_file, remove_zip=False, storage="feather", types=RECORD_TYPES, sources=None, category_types=CATEGORY_TYPES,
+        memory_budget=None):
+    """
+    Parses an export into Data/ and returns the records frame.
+    With a memory_budget (MB) parsed records are spilled to disk in sorted runs and merged into the records file,
+    the summaries are then built one type at a time and the merged records come back as a memory mapped Arrow table.
+    Run again on the same export after a crash to resume from the last checkpointed run.
+    """
+    if sources is None:
+        Watch = detect_source(zip_str)
+        if Watch is None:
+            print(f"No source containing {SOURCE_MATCH} found, keeping records from every source")
+        sources = None if Watch is None else [Watch]
+    spill = None if memory_budget is None else Spill(memory_budget, export_fingerprint(zip_str, types, sources, category_types))
+    df, tables, beats, categories, Stats = parse_health_xml(zip_str, types, sources, category_types, spill)
+    print_stage_stats(Stats)
+    for tag, frame in tables.items():
+        frame.to_feather(f"Data/{TABLES[tag][0]}")
 
+    records_file = f"Data/{storage_path(output_file, storage)}"
+    Watch = ", ".join(sources) if sources else None
+    if spill is None:
+        write_records(df, records_file, storage)
+        write_summaries([df], beats, categories, Watch, records_file)
         return df
 
+    Records = spill.merge(records_file, storage)
+    Row_Bytes = Records.select(SUMMARY_COLUMNS).nbytes / max(Records.num_rows, 1)
+    Rows = max(1000, int(spill.budget * SUMMARY_FRACTION / max(Row_Bytes, 1)))
+    write_summaries(type_frames(Records, SUMMARY_COLUMNS, Rows), beats, categories, Watch, records_file)
+    spill.close()
+    return Records
@@ -0,0 +1,138 @@
+import os
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from pyarrow import feather
+from src.options import Order
+from src.pyramid import local_seconds
+
+ZONES_FILE = "Data/zones.feather"
+HEART_RATE = "HKQuantityTypeIdentifierHeartRate"
+# Zone edges as a percentage of max heart rate, everything under the first edge is "Below Zones"
+ZONE_EDGES = [50, 60, 70, 80, 90]
+# None estimates max heart rate from the export (99.5th percentile, so a stray spike does not shift every zone)
+MAX_HR = None
+# Each sample counts until the next one, but never for longer than this
+MAX_GAP = 10 * 60
+Epoch = pd.Timestamp("1970-01-01")
+
+
+def zone_names(edges=ZONE_EDGES):
+    Bounds = list(edges) + [None]
+    return ["Below Zones"] + [f"Zone {i + 1} ({low}%+)" if high is None else f"Zone {i + 1} ({low}-{high}%)"
+        for i, (low, high) in enumerate(zip(Bounds, Bounds[1:]))]
+
+
+def value_minutes(df, Carry=None):
+    """
+    Minutes the heart rate samples of one chunk of records count for, per local day and value.
+    A sample counts until the next one (capped at MAX_GAP), so the chunk's last sample is held back and returned as
+    the carry, to be weighed against the next chunk's first sample, or against nothing by zone_table.
+    Returns (minutes, value counts, carry), the counts are what max heart rate is estimated from.
+    """
+    Samples = df.loc[df["type"] == HEART_RATE, ["startDate", "value"]]
+    Counts = Samples["value"].value_counts()
+    if Carry is not None:
+        Samples = pd.concat([Carry, Samples], ignore_index=True)
+    if Samples.empty:
+        return empty_minutes(), Counts, None
+    Samples = Samples.sort_values("startDate", kind="mergesort")
+    Seconds = local_seconds(Samples["startDate"])
+    Weight = np.minimum(np.diff(Seconds), MAX_GAP) / 60
+    Minutes = pd.Series(Weight, index=pd.MultiIndex.from_arrays([Seconds[:-1] // 86400, Samples["value"].values[:-1]], names=["day", "value"]))
+    return Minutes.groupby(level=["day", "value"]).sum(), Counts, Samples.iloc[-1:]
+
+
+def empty_minutes():
+    return pd.Series(dtype=float, index=pd.MultiIndex.from_arrays([np.array([], np.int64), np.array([], float)], names=["day", "value"]))
+
+
+def percentile(Counts, q):
+    # np.percentile (linear interpolation) of the values Counts tallies, without the values themselves
+    Values = Counts.index.values[np.argsort(Counts.index.values)]
+    Ends = np.cumsum(Counts.reindex(Values).values)
+    Position = q / 100 * (Ends[-1] - 1)
+    Low = Values[np.searchsorted(Ends, np.floor(Position), side="right")]
+    High = Values[np.searchsorted(Ends, np.ceil(Position), side="right")]
+    Share = Position - np.floor(Position)
+    # Interpolated from whichever neighbour is closer, as numpy does
+    return float(Low + (High - Low) * Share if Share < 0.5 else High - (High - Low) * (1 - Share))
+
+
+def zone_table(Minutes, Counts, Carry, edges=ZONE_EDGES, max_hr=MAX_HR):
+    """
+    Minutes spent in each heart rate zone per local day, as a dense days x zones table, from the value_minutes of
+    every chunk and the carry of the last one (which counts for MAX_GAP). None without heart rate samples.
+    """
+    if Carry is None:
+        return None
+    Last = pd.Series([MAX_GAP / 60], index=pd.MultiIndex.from_arrays([local_seconds(Carry["startDate"]) // 86400, Carry["value"].values], names=["day", "value"]))
+    Minutes = pd.concat([*Minutes, Last]).groupby(level=["day", "value"]).sum()
+    Counts = pd.concat(Counts).groupby(level=0).sum()
+    max_hr = max_hr or percentile(Counts, 99.5)
+
+    Zone = np.digitize(Minutes.index.get_level_values("value").values, np.asarray(edges) / 100 * max_hr)
+    Days, Day_Index = np.unique(Minutes.index.get_level_values("day").values, return_inverse=True)
+    Names = zone_names(edges)
+    Table = np.bincount(Day_Index * len(Names) + Zone, weights=Minutes.values, minlength=len(Days) * len(Names)).reshape(len(Days), len(Names))
+
+    Columns = {"day" : pa.array(Days.astype(np.int32))}
+    Columns.update({Name : pa.array(Table[:, i].astype(np.float32)) for i, Name in enumerate(Names)})
+    return pa.table(Columns).replace_schema_metadata({"max_hr" : str(max_hr)})
+
+
+def build_zones(df, edges=ZONE_EDGES, max_hr=MAX_HR):
+    """
+    Minutes spent in each heart rate zone per local day, as a dense days x zones table.
+    A sample is binned with digitize and weighted by the time until the next sample (capped at MAX_GAP).
+    """
+    Minutes, Counts, Carry = value_minutes(df)
+    return zone_table([Minutes], [Counts], Carry, edges, max_hr)
+
+
+def write_zones(Table, path=ZONES_FILE):
+    # Without heart rate samples the previous upload's zones are removed, readers then see no zones
+    if Table is None:
+        if os.path.exists(path):
+            os.remove(path)
+        return
+    feather.write_feather(Table, path)
+
+
+def read_zones(path=ZONES_FILE):
+    # The stored day rows, None without zones
+    if not os.path.exists(path):
+        return None
+    return feather.read_table(path)
+
+
+def zone_rollups(Table):
+    """
+    The day rows laid out column-wise like the daily rollups, so the browser can stack any date range itself.
+    {"day" : [days since epoch], "max_hr" : max_hr, "zones" : {zone : [minutes]}} or None without zones.
+    """
+    if Table is None:
+        return None
+    Minutes = Table.to_pandas()
+    return {"day" : Minutes.pop("day").tolist(), "max_hr" : float(Table.schema.metadata[b"max_hr"]),
+        "zones" : {Name : [round(float(value), 3) for value in Minutes[Name]] for Name in Minutes.columns}}
+
+
+def zone_minutes(start_date, end_date, path=ZONES_FILE):
+    """
+    Minutes per zone per day, month and weekday after start_date up to and including end_date, sliced from the
+    stored day rows. Returns ({"startDate", "month", "DayofWeek" : frame}, max_hr) or None without zones.
+    """
+    Table = read_zones(path)
+    if Table is None:
+        return None
+    Zones = Table.to_pandas()
+    First, Last = (pd.Timestamp(start_date) - Epoch).days, (pd.Timestamp(end_date) - Epoch).days
+    Zones = Zones[(Zones["day"] > First) & (Zones["day"] <= Last)]
+    Dates = Zones.pop("day").values.astype("datetime64[D]")
+
+    Groups = {
+        "startDate" : Zones.set_index(pd.Index(Dates)),
+        "month" : Zones.groupby(np.datetime_as_string(Dates, unit="M")).sum(),
+        "DayofWeek" : Zones.groupby(np.array(Order)[(Dates.astype(np.int64) + 3) % 7]).sum().reindex(Order, fill_value=0)}
+    return Groups, float(Table.schema.metadata[b"max_hr"])
@@ -0,0 +1,64 @@
+import zipfile
+import numpy as np
+import pandas as pd
+import pytest
+
+WATCH = "Test’s Apple Watch"
+PHONE = "Test’s iPhone"
+DEVICE = "&lt;&lt;HKDevice: 0x1&gt;, name:Apple Watch&gt;"
+
+
+def stamp(local, offset):
+    # export.xml date of a naive local time in a "-0500" style offset
+    return f"{local:%Y-%m-%d %H:%M:%S} {offset}"
+
+
+def record(Type, unit, start, end, offset, value, source=WATCH, children=""):
+    Attributes = (f'type="{Type}" sourceName="{source}" sourceVersion="7.0" device="{DEVICE}" unit="{unit}" '
+        f'creationDate="{stamp(end, offset)}" startDate="{stamp(start, offset)}" endDate="{stamp(end, offset)}" value="{value}"')
+    return f" <Record {Attributes}>\n{children} </Record>\n" if children else f" <Record {Attributes}/>\n"
+
+
+def export_xml(days=40, first="2021-03-01", seed=0):
+    """
+    A small export.xml: heart rate every few minutes, step counts and energy that cross midnight, audio exposure,
+    HRV with beats, sleep from the iPhone, a workout and an activity summary per day.
+    The offset moves from -0500 to -0400 on 2021-03-14 like US daylight saving time.
+    """
+    rng = np.random.default_rng(seed)
+    Lines = ['<?xml version="1.0" encoding="UTF-8"?>\n<HealthData locale="en_US">\n', ' <ExportDate value="2021-05-01 10:00:00 -0400"/>\n']
+    for Day in pd.date_range(first, periods=days, freq="D"):
+        offset = "-0500" if Day < pd.Timestamp("2021-03-14") else "-0400"
+        Minutes = np.cumsum(rng.integers(1, 12, 300))
+        for minute in Minutes[Minutes < 24 * 60]:
+            start = Day + pd.Timedelta(minutes=int(minute), seconds=int(rng.integers(0, 60)))
+            Lines.append(record("HKQuantityTypeIdentifierHeartRate", "count/min", start, start, offset, int(rng.integers(45, 190))))
+        for hour in range(0, 24, 2):
+            start = Day + pd.Timedelta(hours=hour, minutes=50)
+            end = start + pd.Timedelta(minutes=int(rng.integers(5, 90)))
+            Lines.append(record("HKQuantityTypeIdentifierStepCount", "count", start, end, offset, int(rng.integers(10, 900))))
+            Lines.append(record("HKQuantityTypeIdentifierActiveEnergyBurned", "Cal", start, end, offset, round(float(rng.uniform(1, 40)), 2)))
+            Lines.append(record("HKQuantityTypeIdentifierEnvironmentalAudioExposure", "dBASPL", start, end, offset, round(float(rng.uniform(30, 90)), 1)))
+        Lines.append(record("HKQuantityTypeIdentifierStepCount", "count", Day + pd.Timedelta(hours=9), Day + pd.Timedelta(hours=9, minutes=5), offset, 40, source=PHONE))
+        start = Day + pd.Timedelta(hours=9)
+        Beats = "".join(f'   <InstantaneousBeatsPerMinute bpm="{int(rng.integers(55, 80))}" time="9:0{i}:1{i}.5{i} AM"/>\n' for i in range(5))
+        Lines.append(record("HKQuantityTypeIdentifierHeartRateVariabilitySDNN", "ms", start, start + pd.Timedelta(minutes=1), offset, round(float(rng.uniform(20, 90)), 1),
+            children=f"  <HeartRateVariabilityMetadataList>\n{Beats}  </HeartRateVariabilityMetadataList>\n"))
+        Lines.append(f' <Record type="HKCategoryTypeIdentifierSleepAnalysis" sourceName="{PHONE}" sourceVersion="14" creationDate="{stamp(Day + pd.Timedelta(hours=31), offset)}" '
+            f'startDate="{stamp(Day + pd.Timedelta(hours=23), offset)}" endDate="{stamp(Day + pd.Timedelta(hours=31), offset)}" value="HKCategoryValueSleepAnalysisAsleep"/>\n')
+        Lines.append(f' <Workout workoutActivityType="HKWorkoutActivityTypeRunning" duration="30.5" durationUnit="min" totalDistance="3.1" totalDistanceUnit="mi" '
+            f'totalEnergyBurned="300" totalEnergyBurnedUnit="Cal" sourceName="{WATCH}" sourceVersion="7.0" creationDate="{stamp(Day + pd.Timedelta(hours=7), offset)}" '
+            f'startDate="{stamp(Day + pd.Timedelta(hours=7), offset)}" endDate="{stamp(Day + pd.Timedelta(hours=7, minutes=30), offset)}"/>\n')
+        Lines.append(f' <ActivitySummary dateComponents="{Day:%Y-%m-%d}" activeEnergyBurned="500" activeEnergyBurnedGoal="600" activeEnergyBurnedUnit="Cal" '
+            'appleMoveTime="0" appleMoveTimeGoal="0" appleExerciseTime="35" appleExerciseTimeGoal="30" appleStandHours="12" appleStandHoursGoal="12"/>\n')
+    Lines.append("</HealthData>\n")
+    return "".join(Lines)
+
+
+@pytest.fixture(scope="session")
+def export_zip(tmp_path_factory):
+    # Path of a zipped export shared by every test that ingests one
+    path = tmp_path_factory.mktemp("export") / "export.zip"
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as f:
+        f.writestr("apple_health_export/export.xml", export_xml())
+    return str(path)
@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+import pytest
+from src.intervals import split_intervals, apportion, DAY, HOUR
+from src.timestamps import parse_timestamps
+
+Epoch = pd.Timestamp("1970-01-01")
+
+
+def reference_split(Starts, Ends, width):
+    # Every [start, end) cut at the multiples of width with pandas timestamps, as sorted (row, bucket, fraction) rows
+    Freq = pd.Timedelta(seconds=width)
+    Rows = []
+    for row, (start, end) in enumerate(zip(Starts, Ends)):
+        end = max(end, start)
+        if end == start:
+            Rows.append((row, (start - Epoch) // Freq, 1.0))
+            continue
+        for edge in pd.date_range(start.floor(Freq), end - pd.Timedelta(seconds=1), freq=Freq):
+            Overlap = min(end, edge + Freq) - max(start, edge)
+            Rows.append((row, (edge - Epoch) // Freq, Overlap / (end - start)))
+    return pd.DataFrame(Rows, columns=["row", "bucket", "fraction"])
+
+
+def split_frame(Starts, Ends, width):
+    Seconds = lambda Dates: (pd.DatetimeIndex(Dates) - Epoch) // pd.Timedelta(seconds=1)
+    row, bucket, fraction = split_intervals(Seconds(Starts), Seconds(Ends), width)
+    return pd.DataFrame({"row" : row, "bucket" : bucket, "fraction" : fraction})
+
+
+@pytest.mark.parametrize("width", [DAY, HOUR])
+def test_split_intervals_across_midnight(width):
+    rng = np.random.default_rng(0)
+    Starts = pd.Timestamp("2020-12-30") + pd.to_timedelta(rng.integers(0, 5 * 86400, 300), unit="s")
+    Ends = Starts + pd.to_timedelta(rng.choice([0, 59, 3600, 7 * 3600, 30 * 3600, 3 * 86400], 300), unit="s")
+    # Exactly at midnight, ending on midnight, ending before the start
+    Starts = Starts.append(pd.DatetimeIndex(["2021-01-01 00:00", "2020-12-31 23:00", "2021-01-01 10:00"]))
+    Ends = Ends.append(pd.DatetimeIndex(["2021-01-02 00:00", "2021-01-01 00:00", "2021-01-01 09:00"]))
+    pd.testing.assert_frame_equal(split_frame(Starts, Ends, width), reference_split(Starts, Ends, width), check_dtype=False)
+
+
+def test_split_intervals_across_daylight_saving():
+    # Offsets change between start and end, the end is read on the start's wall clock like the ingestion does
+    Strings = [("2021-03-13 23:30:00 -0500", "2021-03-14 03:30:00 -0400"), ("2021-03-14 01:00:00 -0500", "2021-03-14 04:00:00 -0400"),
+        ("2021-11-06 22:00:00 -0400", "2021-11-07 01:30:00 -0500"), ("2021-11-07 01:30:00 -0400", "2021-11-07 01:10:00 -0500")]
+    Start_Local, Start_Offset, _ = parse_timestamps([start for start, _ in Strings])
+    End_Local, End_Offset, _ = parse_timestamps([end for _, end in Strings])
+    End_Local = End_Local - End_Offset + Start_Offset
+
+    Starts = [pd.Timestamp(start) for start, _ in Strings]
+    Ends = [pd.Timestamp(end).tz_convert(start.tzinfo) for start, (_, end) in zip(Starts, Strings)]
+    Reference = reference_split([start.tz_localize(None) for start in Starts], [end.tz_localize(None) for end in Ends], HOUR)
+    row, bucket, fraction = split_intervals(Start_Local, End_Local, HOUR)
+    pd.testing.assert_frame_equal(pd.DataFrame({"row" : row, "bucket" : bucket, "fraction" : fraction}), Reference, check_dtype=False)
+
+
+def test_apportion_matches_pandas():
+    df = pd.DataFrame({
+        "type" : ["a", "a", "b", "b"],
+        "startDate" : pd.to_datetime(["2021-01-01 23:00", "2021-01-02 12:00", "2021-01-01 18:00", "2021-01-03 00:00"]),
+        "endDate" : pd.to_datetime(["2021-01-02 01:00", "2021-01-02 12:00", "2021-01-03 06:00", "2021-01-03 00:30"]),
+        "value" : [10.0, 5.0, 36.0, 3.0]})
+    Pieces = reference_split(df["startDate"], df["endDate"], DAY)
+    Reference = pd.DataFrame({"type" : df["type"].values[Pieces["row"]], "bucket" : Pieces["bucket"], "value" : df["value"].values[Pieces["row"]] * Pieces["fraction"]})
+    Reference = Reference.groupby(["type", "bucket"])["value"].sum().reset_index()
+    pd.testing.assert_frame_equal(apportion(df), Reference, check_dtype=False)
+    assert apportion(df)["value"].sum() == pytest.approx(df["value"].sum())
@@ -0,0 +1,74 @@
+import json
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+from pyarrow import feather
+from src import upload
+from src.spill import merge_slices
+
+
+def sorted_run(rng, rows, run):
+    # A spilled run: rows sorted on startDate, with many ties inside and across runs
+    Starts = np.sort(rng.integers(0, 200, rows)).astype("datetime64[s]").astype("datetime64[ns]")
+    return pa.table({"startDate" : Starts, "run" : np.full(rows, run), "position" : np.arange(rows)})
+
+
+@pytest.mark.parametrize("block", [1, 3, 64, 10_000])
+def test_merge_slices_matches_pandas(block):
+    rng = np.random.default_rng(block)
+    Runs = [sorted_run(rng, rows, run) for run, rows in enumerate([0, 1, 250, 97, 400])]
+    Slices = [(Run, start, end) for Run, start, end in [(Runs[0], 0, 0), (Runs[1], 0, 1), (Runs[2], 10, 240), (Runs[3], 0, 97), (Runs[4], 399, 400)]]
+    Merged = pa.concat_tables(list(merge_slices([Slice for Slice in Slices if Slice[2] > Slice[1]], block, lambda Part: Part))).to_pandas()
+
+    # A stable sort of the slices in run order keeps ties in run order, as the merge promises
+    Reference = pd.concat([Run.slice(start, end - start).to_pandas() for Run, start, end in Slices], ignore_index=True)
+    Reference = Reference.sort_values("startDate", kind="mergesort").reset_index(drop=True)
+    pd.testing.assert_frame_equal(Merged, Reference)
+
+
+def ingest(root, zip_path, monkeypatch, **kwargs):
+    # Data/ paths are relative, every ingestion gets its own working directory
+    (root / "Data").mkdir(parents=True, exist_ok=True)
+    monkeypatch.chdir(root)
+    upload.health_xml_to_feather(zip_path, "data.feather", **kwargs)
+    return root / "Data"
+
+
+def read_outputs(Data):
+    Records = feather.read_table(Data / "data.feather").to_pandas()
+    Manifest = json.loads((Data / "config.json").read_text())
+    Rollups = json.loads((Data / "rollups.json").read_text())["rollups"]
+    Pyramid = pq.read_table(Data / "pyramid.parquet").to_pandas().sort_values(["type", "level", "time"]).reset_index(drop=True)
+    Tables = {name : feather.read_table(Data / name).to_pandas() for name in ["sketches.feather", "prefix.feather", "zones.feather", "categories.feather",
+        "heartbeats.feather", "workouts.feather", "activity_summaries.feather", "correlations.feather"]}
+    return Records.sort_values("recordId").reset_index(drop=True), Manifest, Rollups, Pyramid, Tables
+
+
+def test_spilled_resume_matches_unbudgeted(export_zip, tmp_path, monkeypatch, capsys):
+    Plain = read_outputs(ingest(tmp_path / "plain", export_zip, monkeypatch))
+
+    # A crash part way through leaves checkpointed runs, the second ingestion resumes after them.
+    # A 1 MB budget spills every batch and summarizes each type in several chunks.
+    convert_records, Calls = upload.convert_records, []
+    def crash(rows):
+        Calls.append(len(rows))
+        if len(Calls) == 3:
+            raise RuntimeError("crashed")
+        return convert_records(rows)
+    monkeypatch.setattr(upload, "convert_records", crash)
+    with pytest.raises(RuntimeError):
+        ingest(tmp_path / "spilled", export_zip, monkeypatch, memory_budget=1)
+    monkeypatch.setattr(upload, "convert_records", convert_records)
+    capsys.readouterr()
+    Spilled = read_outputs(ingest(tmp_path / "spilled", export_zip, monkeypatch, memory_budget=1))
+    assert "Resuming after" in capsys.readouterr().out
+
+    pd.testing.assert_frame_equal(Spilled[0], Plain[0], check_dtype=False, check_categorical=False)
+    for key in ["Rows", "First Date Instance", "Last Date Instance", "Types"]:
+        assert Spilled[1][key] == Plain[1][key]
+    assert Spilled[2] == Plain[2]
+    pd.testing.assert_frame_equal(Spilled[3], Plain[3])
+    for name, Table in Plain[4].items():
+        pd.testing.assert_frame_equal(Spilled[4][name], Table, check_dtype=False, check_categorical=False, obj=name)
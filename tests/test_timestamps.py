@@ -0,0 +1,42 @@
+import numpy as np
+import pandas as pd
+import pytest
+from src.timestamps import parse_timestamps, civil_from_days, days_from_civil, wall_clock
+
+Epoch = pd.Timestamp("1970-01-01")
+
+
+def test_civil_from_days_matches_pandas():
+    # Before and after 1970, across leap days and century years
+    Days = np.concatenate([np.arange(-100_000, 100_000, 37), [-1, 0, 1, -719, 11_016, 11_017, 10_956, -25_508]])
+    Year, Month, Day = civil_from_days(Days)
+    Dates = Epoch + pd.to_timedelta(Days, unit="D")
+    np.testing.assert_array_equal(Year, Dates.year)
+    np.testing.assert_array_equal(Month, Dates.month)
+    np.testing.assert_array_equal(Day, Dates.day)
+    np.testing.assert_array_equal(days_from_civil(Year, Month, Day), Days)
+
+
+@pytest.mark.parametrize("offset", ["-0500", "-0400", "+0000", "+0530", "-0330", "+0545", "-0930", "+1400", "-1200"])
+def test_parse_timestamps_matches_pandas(offset):
+    rng = np.random.default_rng(0)
+    Local = pd.Timestamp("1969-06-01") + pd.to_timedelta(rng.integers(0, 60 * 365 * 86400, 500), unit="s")
+    Strings = [f"{local:%Y-%m-%d %H:%M:%S} {offset}" for local in [*Local, pd.Timestamp("2021-03-14 02:30:00"), pd.Timestamp("2020-02-29 23:59:59")]]
+
+    Seconds, Offsets, Valid = parse_timestamps(Strings)
+    Reference = [pd.Timestamp(value) for value in Strings]
+    assert Valid.all()
+    np.testing.assert_array_equal(Seconds, [(stamp.tz_localize(None) - Epoch) // pd.Timedelta(seconds=1) for stamp in Reference])
+    np.testing.assert_array_equal(Offsets, [stamp.utcoffset().total_seconds() for stamp in Reference])
+    np.testing.assert_array_equal(wall_clock(Seconds, Valid), pd.DatetimeIndex([stamp.tz_localize(None) for stamp in Reference]).values)
+
+
+def test_parse_timestamps_rejects_malformed():
+    Strings = ["2021-1-01 10:00:00 -0500", "2021-02-30 10:00:00 -0500", "2021-13-01 10:00:00 -0500", "2021-01-01 24:00:00 -0500",
+        "2021-01-01 10:00:00 -05:00", "2021-01-01 10:00:00 -0560", "2021-01-01T10:00:00 -0500", "", None, float("nan"), "2021-01-01 10:00:00 -0500 ",
+        "2021‐01‐01 10:00:00 -0500", "2020-02-29 10:00:00 +0530"]
+    Seconds, Offsets, Valid = parse_timestamps(Strings)
+    np.testing.assert_array_equal(Valid, [False] * 12 + [True])
+    assert (Seconds[:-1] == 0).all() and (Offsets[:-1] == 0).all()
+    assert Offsets[-1] == 5.5 * 3600
+    assert pd.isna(wall_clock(Seconds, Valid)[:-1]).all()